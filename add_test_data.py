@@ -11,100 +11,119 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from db import SessionLocal, engine
 from models import Base, Load, User, Role, Shift
+import board_cache
+import events
 
-def create_test_data():
-    """Dodaj przykładowe dane do bazy danych"""
+class TestDataError(Exception):
+    """Nie da się dodać danych (brak użytkownika, który ma być ich autorem)"""
+
+
+def create_test_data(db, user_id=None):
+    """Dodaj przykładowe dane do bazy danych.
+
+    Autorem rekordów jest `user_id` (użytkownik, który zlecił zadanie), a bez
+    niego - admin z ADMIN_EMAIL. Zwraca {"added": n, "message": ...} albo
+    {"skipped": powód}, gdy baza zawiera już dane.
+    """
+    if user_id is not None:
+        admin = db.get(User, user_id)
+    else:
+        admin = db.query(User).filter_by(email=os.getenv("ADMIN_EMAIL", "admin@example.com").lower()).first()
+    if not admin:
+        raise TestDataError("Użytkownik, który ma być autorem danych, nie istnieje")
+
+    # Sprawdź czy już są dane
+    existing_loads = db.query(Load).count()
+    if existing_loads > 0:
+        return {"skipped": f"Baza już zawiera {existing_loads} rekordów. Pomijam dodawanie danych."}
     
-    # Utwórz tabele jeśli nie istnieją
-    Base.metadata.create_all(engine)
+    # Dodaj przykładowe dane
+    test_loads = [
+        # Slot 17:00 - L01
+        Load(
+            time_slot="17:00",
+            lane="L01",
+            trailer_no="TR001",
+            status="PL",
+            ship_date="04.10.2025",
+            area="J01",
+            seq=1,
+            planned=100,
+            done=0,
+            lo_code="LO001",
+            picker="Jan Kowalski",
+            shift=Shift.A,
+            created_by_id=admin.id
+        ),
+        Load(
+            time_slot="17:00",
+            lane="L01",
+            trailer_no="TR001",
+            status="PL",
+            ship_date="04.10.2025",
+            area="J02",
+            seq=2,
+            planned=50,
+            done=0,
+            lo_code="LO002",
+            picker="Anna Nowak",
+            shift=Shift.A,
+            created_by_id=admin.id
+        ),
+        # Slot 17:00 - L02
+        Load(
+            time_slot="17:00",
+            lane="L02",
+            trailer_no="TR002",
+            status="PA",
+            ship_date="04.10.2025",
+            area="J03",
+            seq=1,
+            planned=75,
+            done=25,
+            lo_code="LO003",
+            picker="Piotr Wiśniewski",
+            shift=Shift.A,
+            created_by_id=admin.id
+        ),
+        # Slot 18:00 - L01
+        Load(
+            time_slot="18:00",
+            lane="L01",
+            trailer_no="TR003",
+            status="PL",
+            ship_date="05.10.2025",
+            area="J01",
+            seq=1,
+            planned=200,
+            done=0,
+            lo_code="LO004",
+            picker="Maria Kowalczyk",
+            shift=Shift.B,
+            created_by_id=admin.id
+        ),
+    ]
     
-    with SessionLocal() as db:
-        # Sprawdź czy admin istnieje
-        admin = db.query(User).filter_by(email="admin@example.com").first()
-        if not admin:
-            print("Błąd: Admin nie istnieje!")
-            return
-        
-        # Sprawdź czy już są dane
-        existing_loads = db.query(Load).count()
-        if existing_loads > 0:
-            print(f"Baza już zawiera {existing_loads} rekordów. Pomijam dodawanie danych.")
-            return
-        
-        # Dodaj przykładowe dane
-        test_loads = [
-            # Slot 17:00 - L01
-            Load(
-                time_slot="17:00",
-                lane="L01",
-                trailer_no="TR001",
-                status="PL",
-                ship_date="04.10.2025",
-                area="J01",
-                seq=1,
-                planned=100,
-                done=0,
-                lo_code="LO001",
-                picker="Jan Kowalski",
-                shift=Shift.A,
-                created_by_id=admin.id
-            ),
-            Load(
-                time_slot="17:00",
-                lane="L01",
-                trailer_no="TR001",
-                status="PL",
-                ship_date="04.10.2025",
-                area="J02",
-                seq=2,
-                planned=50,
-                done=0,
-                lo_code="LO002",
-                picker="Anna Nowak",
-                shift=Shift.A,
-                created_by_id=admin.id
-            ),
-            # Slot 17:00 - L02
-            Load(
-                time_slot="17:00",
-                lane="L02",
-                trailer_no="TR002",
-                status="PA",
-                ship_date="04.10.2025",
-                area="J03",
-                seq=1,
-                planned=75,
-                done=25,
-                lo_code="LO003",
-                picker="Piotr Wiśniewski",
-                shift=Shift.A,
-                created_by_id=admin.id
-            ),
-            # Slot 18:00 - L01
-            Load(
-                time_slot="18:00",
-                lane="L01",
-                trailer_no="TR003",
-                status="PL",
-                ship_date="05.10.2025",
-                area="J01",
-                seq=1,
-                planned=200,
-                done=0,
-                lo_code="LO004",
-                picker="Maria Kowalczyk",
-                shift=Shift.B,
-                created_by_id=admin.id
-            ),
-        ]
-        
-        # Dodaj dane do bazy
-        for load in test_loads:
-            db.add(load)
-        
-        db.commit()
-        print(f"Dodano {len(test_loads)} przykładowych rekordów do bazy danych!")
-        print("Teraz odśwież aplikację - Tablica powinna pokazać dane!")
+    # Dodaj dane do bazy
+    for load in test_loads:
+        db.add(load)
+    
+    events.record(db, board_cache.stamp(db, *test_loads), "reset")
+    db.commit()
+    return {"added": len(test_loads),
+            "message": f"Dodano {len(test_loads)} przykładowych rekordów do bazy danych!"}
 
 if __name__ == "__main__":
-    create_test_data()
+    # Utwórz tabele jeśli nie istnieją
+    Base.metadata.create_all(engine)
+    with SessionLocal() as session:
+        try:
+            result = create_test_data(session)
+        except TestDataError as e:
+            print(f"Błąd: {e}")
+            sys.exit(1)
+    if "skipped" in result:
+        print(result["skipped"])
+    else:
+        print(result["message"])
+        print("Teraz odśwież aplikację - Tablica powinna pokazać dane!")
@@ -1,19 +1,54 @@
 from flask import Flask, render_template, redirect, url_for, request, flash
 from flask_login import login_required, current_user
 import os
-from db import engine, SessionLocal
-from models import Base, User, Role
-from auth import auth_bp, login_manager, init_db_and_admin, require_roles
+import secrets
+import click
+from db import engine, read_engine, SessionLocal, ReadSession
+from models import User, Role
+from auth import auth_bp, login_manager, init_db_and_admin, require_roles, user_changed
 from loads import loads_bp
 from kpi import kpi_bp
-from passlib.hash import pbkdf2_sha256
+from jobs import jobs_bp
+import jobs
+import board_cache
+import events
+import metrics
+import assets
+import logging_setup
+import user_cache
+from passwords import hash_password
 import re
 
-app = Flask(__name__)
+# klucz sesji wspólny dla wszystkich workerów: FLASK_SECRET albo plik tworzony raz
+SECRET_KEY_FILE = os.getenv("SECRET_KEY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "secret_key"))
+
+
+def load_secret_key(path=SECRET_KEY_FILE):
+    """FLASK_SECRET ze środowiska albo klucz z pliku (generowany przy pierwszym użyciu).
+
+    Losowy klucz w każdym procesie psuł sesje między workerami - logowanie
+    z jednego workera nie było ważne w drugim.
+    """
+    key = os.getenv("FLASK_SECRET")
+    if key:
+        return key
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        # O_EXCL: przy równoczesnym starcie workerów plik zapisze tylko jeden
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(secrets.token_hex(32))
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip()
 
-# Ustaw unikalne sesje dla różnych przeglądarek
-import secrets
-app.secret_key = secrets.token_hex(32)
 
 def validate_password(password):
     """Walidacja hasła: min 6 znaków, przynajmniej jedna duża litera"""
@@ -22,26 +57,52 @@ def validate_password(password):
     if not re.search(r'[A-Z]', password):
         return False, "Hasło musi zawierać przynajmniej jedną dużą literę"
     return True, "Hasło jest poprawne"
-app.config["SECRET_KEY"] = os.getenv("FLASK_SECRET", "dev-secret")
 
-# DB init & admin
-Base.metadata.create_all(engine)
-init_db_and_admin()
 
-# login manager
-login_manager.init_app(app)
+def bootstrap():
+    """Jednorazowe przygotowanie bazy: migracje, konto admina, wiersz board_state"""
+    init_db_and_admin()
+
+
+def create_app():
+    """Fabryka aplikacji - bez dostępu do bazy; schemat i admin: `flask --app app init-db`"""
+    app = Flask(__name__)
+    logging_setup.init_app(app)
+    # kompresja rejestrowana przed metrykami - after_request wołane są od końca, więc kompresuje na samym końcu
+    assets.init_app(app)
+    app.config["SECRET_KEY"] = load_secret_key()
+
+    # login manager
+    login_manager.init_app(app)
+
+    # blueprints
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(loads_bp)
+    app.register_blueprint(kpi_bp)
+    app.register_blueprint(jobs_bp)
+
+    # widoki bez blueprintu - nazwy endpointów bez prefiksu (url_for("users_manage"))
+    app.add_url_rule("/", view_func=dashboard)
+    app.add_url_rule("/users", view_func=users_manage, methods=["GET", "POST"])
+    app.add_url_rule("/clear_all_data", view_func=clear_all_data)
+    app.add_url_rule("/add_test_data", view_func=add_test_data)
+
+    # metryki (/metrics)
+    metrics.init_app(app, engine, read_engine)
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Tworzy/migruje schemat i konto admina (raz przy wdrożeniu)"""
+        bootstrap()
+        click.echo("Baza gotowa")
+
+    return app
 
-# blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(loads_bp)
-app.register_blueprint(kpi_bp)
 
-@app.route("/")
 @login_required
 def dashboard():
     return redirect(url_for("loads.list_loads"))
 
-@app.route("/users", methods=["GET", "POST"])
 @login_required
 @require_roles(Role.ADMIN, Role.SUPERVISOR)
 def users_manage():
@@ -72,7 +133,7 @@ def users_manage():
                     flash("Taki użytkownik już istnieje", "error")
                 else:
                     db.add(User(email=email, full_name=full_name,
-                                password_hash=pbkdf2_sha256.hash(password),
+                                password_hash=hash_password(password),
                                 role=role, is_active=True))
                     db.commit()
                     flash("Użytkownik dodany", "success")
@@ -91,6 +152,7 @@ def users_manage():
                     user.full_name = full_name
                     user.role = Role[role_str]
                     db.commit()
+                    user_changed(user)
                     flash("Użytkownik zaktualizowany", "success")
         
         elif action == "change_password":
@@ -107,8 +169,9 @@ def users_manage():
             with SessionLocal() as db:
                 user = db.query(User).get(user_id)
                 if user:
-                    user.password_hash = pbkdf2_sha256.hash(new_password)
+                    user.password_hash = hash_password(new_password)
                     db.commit()
+                    user_changed(user)
                     flash("Hasło zmienione", "success")
         
         elif action == "delete":
@@ -119,15 +182,15 @@ def users_manage():
                 if user and user.id != current_user.id:  # Nie można usunąć siebie
                     db.delete(user)
                     db.commit()
+                    user_cache.invalidate(user_id)
                     flash("Użytkownik usunięty", "success")
                 else:
                     flash("Nie można usunąć tego użytkownika", "error")
     
-    with SessionLocal() as db:
+    with ReadSession() as db:
         users = db.query(User).all()
     return render_template("users.html", users=users)
 
-@app.route("/clear_all_data")
 @login_required
 @require_roles(Role.ADMIN)
 def clear_all_data():
@@ -136,101 +199,26 @@ def clear_all_data():
     
     with SessionLocal() as db:
         # Usuń wszystkie rekordy Load
+        version = board_cache.bump_version(db)
+        board_cache.record_delete_all(db, version)
+        events.record(db, version, "reset")
         db.query(Load).delete()
         db.commit()
         return f"Wyczyszczono wszystkie dane z bazy! <a href='/loads'>Przejdź do Tablicy</a>"
 
-@app.route("/add_test_data")
 @login_required
 @require_roles(Role.ADMIN)
 def add_test_data():
-    """Endpoint do dodania przykładowych danych testowych"""
-    from models import Load, Shift
-    
-    with SessionLocal() as db:
-        # Sprawdź czy już są dane
-        existing_loads = db.query(Load).count()
-        if existing_loads > 0:
-            return f"Baza już zawiera {existing_loads} rekordów. Pomijam dodawanie danych."
-        
-        # Dodaj przykładowe dane
-        test_loads = [
-            # Slot 17:00 - L01
-            Load(
-                time_slot="17:00",
-                lane="L01",
-                trailer_no="TR001",
-                status="PL",
-                ship_date="04.10.2025",
-                area="J01",
-                seq=1,
-                planned=100,
-                done=0,
-                lo_code="LO001",
-                picker="Jan Kowalski",
-                shift=Shift.A,
-                created_by_id=current_user.id
-            ),
-            Load(
-                time_slot="17:00",
-                lane="L01",
-                trailer_no="TR001",
-                status="PL",
-                ship_date="04.10.2025",
-                area="J02",
-                seq=2,
-                planned=50,
-                done=0,
-                lo_code="LO002",
-                picker="Anna Nowak",
-                shift=Shift.A,
-                created_by_id=current_user.id
-            ),
-            # Slot 17:00 - L02
-            Load(
-                time_slot="17:00",
-                lane="L02",
-                trailer_no="TR002",
-                status="PA",
-                ship_date="04.10.2025",
-                area="J03",
-                seq=1,
-                planned=75,
-                done=25,
-                lo_code="LO003",
-                picker="Piotr Wiśniewski",
-                shift=Shift.A,
-                created_by_id=current_user.id
-            ),
-            # Slot 18:00 - L01
-            Load(
-                time_slot="18:00",
-                lane="L01",
-                trailer_no="TR003",
-                status="PL",
-                ship_date="05.10.2025",
-                area="J01",
-                seq=1,
-                planned=200,
-                done=0,
-                lo_code="LO004",
-                picker="Maria Kowalczyk",
-                shift=Shift.B,
-                created_by_id=current_user.id
-            ),
-        ]
-        
-        # Dodaj dane do bazy
-        for load in test_loads:
-            db.add(load)
-        
-        db.commit()
-        return f"Dodano {len(test_loads)} przykładowych rekordów do bazy danych! <a href='/loads'>Przejdź do Tablicy</a>"
+    """Endpoint do dodania przykładowych danych testowych - zadanie w tle (jak run_add_data.py)"""
+    return jobs.accepted(jobs.submit("seed_test_data", {"user_id": current_user.id}, user_id=current_user.id))
+
+app = create_app()
 
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_ENV") == "development"
-    
+
+    # lokalny serwer deweloperski - przygotowuje bazę sam
+    bootstrap()
     print(f"Starting Flask on port {port}")
     app.run(host="0.0.0.0", port=port, debug=debug)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Archiwizacja zakończonych ładunków: `loads` -> `loads_archive`.
+
+Przenosi rekordy starsze niż ARCHIVE_AFTER_DAYS dni (po ship_day) oraz
+rekordy w statusie LO, które nie zmieniły się od ARCHIVE_LO_AFTER_HOURS
+godzin. Pracuje partiami (każda partia to osobna, krótka transakcja),
+więc tabela główna zostaje mała, a blokady są krótkie. Przy okazji
+czyści stare zdarzenia SSE i tombstone'y.
+
+Uruchomienie:
+    python archive.py                 # jednorazowo
+    python archive.py --dry-run       # tylko policz kandydatów
+    python archive.py --every 3600    # w pętli, co godzinę
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Dodaj ścieżkę do modułów aplikacji
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import select, insert, delete, func, literal, or_, and_, union_all
+from db import SessionLocal, engine
+from models import Load, LoadArchive, LoadTombstone, LoadEvent, LoadCreateKey, BoardState, operational_day
+from migrations import run_migrations
+import board_cache
+import events
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "14"))
+ARCHIVE_LO_AFTER_HOURS = int(os.getenv("ARCHIVE_LO_AFTER_HOURS", "24"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+EVENTS_RETENTION_HOURS = int(os.getenv("EVENTS_RETENTION_HOURS", "48"))
+
+LOAD_COLUMNS = [c.name for c in Load.__table__.columns]
+
+
+def archive_criteria(days=ARCHIVE_AFTER_DAYS, lo_hours=ARCHIVE_LO_AFTER_HOURS):
+    """Warunek WHERE dla rekordów do archiwizacji"""
+    cutoff_day = operational_day() - timedelta(days=days)
+    lo_cutoff = datetime.utcnow() - timedelta(hours=lo_hours)
+    return or_(
+        Load.ship_day < cutoff_day,
+        and_(Load.status == "LO", func.coalesce(Load.updated_at, Load.created_at) < lo_cutoff),
+    )
+
+
+def archive_batch(db, criteria, batch_size=ARCHIVE_BATCH_SIZE):
+    """Przenosi jedną partię do archiwum w jednej transakcji; zwraca liczbę wierszy"""
+    ids = db.scalars(select(Load.id).where(criteria).order_by(Load.id).limit(batch_size)).all()
+    if not ids:
+        return 0
+
+    in_batch = Load.id.in_(ids)
+    version = board_cache.bump_version(db)
+    db.execute(insert(LoadArchive).from_select(
+        LOAD_COLUMNS + ["archived_at"],
+        select(*[Load.__table__.c[name] for name in LOAD_COLUMNS], literal(datetime.utcnow())).where(in_batch),
+    ))
+    # dla ekranów to zwykłe usunięcie: tombstone (delta-sync) + zdarzenie (SSE)
+    board_cache.record_delete_all(db, version, in_batch)
+    events.record_deletes(db, version, in_batch)
+    db.execute(delete(Load).where(in_batch))
+    db.commit()
+    return len(ids)
+
+
+def prune_sync_log(db, hours=EVENTS_RETENTION_HOURS):
+    """Usuwa stare zdarzenia SSE i tombstone'y; zapamiętuje granicę dla klientów delta-sync"""
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    max_rev = db.scalar(select(func.max(LoadTombstone.revision)).where(LoadTombstone.deleted_at < cutoff))
+    removed = 0
+    if max_rev is not None:
+        removed += db.execute(delete(LoadTombstone).where(LoadTombstone.revision <= max_rev)).rowcount
+        state = db.get(BoardState, board_cache.BOARD_STATE_ID)
+        if state:
+            state.pruned_revision = max(state.pruned_revision or 0, max_rev)
+    removed += db.execute(delete(LoadEvent).where(LoadEvent.created_at < cutoff)).rowcount
+    # klucze idempotencji autosave - ponowienia przychodzą w ciągu sekund, nie dni
+    removed += db.execute(delete(LoadCreateKey).where(LoadCreateKey.created_at < cutoff)).rowcount
+    db.commit()
+    return removed
+
+
+def run_archive(days=ARCHIVE_AFTER_DAYS, lo_hours=ARCHIVE_LO_AFTER_HOURS,
+                batch_size=ARCHIVE_BATCH_SIZE, max_batches=None, dry_run=False):
+    """Archiwizuje partiami aż do wyczerpania kandydatów; zwraca listę statystyk partii"""
+    stats = []
+    with SessionLocal() as db:
+        criteria = archive_criteria(days, lo_hours)
+        if dry_run:
+            count = db.scalar(select(func.count()).select_from(Load).where(criteria))
+            print(f"[archive] kandydatów do archiwizacji: {count}")
+            return stats
+
+        while max_batches is None or len(stats) < max_batches:
+            t0 = time.perf_counter()
+            moved = archive_batch(db, criteria, batch_size)
+            if not moved:
+                break
+            ms = (time.perf_counter() - t0) * 1000
+            stats.append({"batch": len(stats) + 1, "rows": moved, "ms": round(ms, 1)})
+            print(f"[archive] partia {len(stats)}: przeniesiono {moved} wierszy w {ms:.1f} ms")
+
+        pruned = prune_sync_log(db)
+
+    total = sum(s["rows"] for s in stats)
+    print(f"[archive] razem: {total} wierszy w {len(stats)} partiach; usunięto {pruned} starych zdarzeń/tombstone")
+    return stats
+
+
+def loads_with_archive():
+    """SELECT łączący `loads` i `loads_archive` (wspólne kolumny) - do raportów"""
+    archive = LoadArchive.__table__
+    return union_all(
+        select(*[Load.__table__.c[name] for name in LOAD_COLUMNS]),
+        select(*[archive.c[name] for name in LOAD_COLUMNS]),
+    ).subquery("loads_all")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archiwizacja zakończonych ładunków")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archiwizuj rekordy z ship_day starszym niż N dni")
+    parser.add_argument("--lo-hours", type=int, default=ARCHIVE_LO_AFTER_HOURS,
+                        help="archiwizuj rekordy LO niezmieniane od N godzin")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SIZE, help="rozmiar partii")
+    parser.add_argument("--max-batches", type=int, default=None, help="limit partii w jednym przebiegu")
+    parser.add_argument("--dry-run", action="store_true", help="tylko policz kandydatów")
+    parser.add_argument("--every", type=int, default=None, metavar="SECONDS",
+                        help="uruchamiaj cyklicznie co N sekund")
+    args = parser.parse_args(argv)
+
+    run_migrations(engine)
+    while True:
+        run_archive(args.days, args.lo_hours, args.batch, args.max_batches, args.dry_run)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
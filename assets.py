@@ -0,0 +1,244 @@
+# assets.py
+"""
+Kompresja odpowiedzi i statyczne pliki z hashem w nazwie.
+
+Kompresja: odpowiedzi HTML/JSON/tekst większe niż COMPRESS_MIN_SIZE są
+wysyłane jako brotli (jeśli zainstalowany pakiet `Brotli`) albo gzip,
+zależnie od Accept-Encoding. Strumienie (SSE, eksporty) i pliki statyczne
+nie są kompresowane w locie. ETag skompresowanej odpowiedzi dostaje
+sufiks kodowania (-br / -gz); przed widokiem sufiks jest zdejmowany z
+If-None-Match, więc widoki porównują swoje własne ETagi bez zmian.
+
+Pliki statyczne: `url_for('static', filename='css/base.css')` zwraca
+`/static/css/base.<hash>.css` (hash z treści pliku), a taki adres jest
+serwowany z nagłówkiem `Cache-Control: public, max-age=<rok>, immutable` -
+przeglądarka nie pyta o niego ponownie, dopóki plik się nie zmieni (wtedy
+zmienia się nazwa). Jeśli obok pliku leży `.br` / `.gz` (komenda
+`flask --app app assets-build`), wysyłana jest gotowa skompresowana wersja.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import click
+from flask import g, request, send_from_directory, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:         # opcjonalnie - bez pakietu tylko gzip
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESS_MIMETYPES = {"text/html", "application/json", "text/plain"}
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 3600)))
+
+# pliki kompresowane z góry przez assets-build (kompresja maksymalna - robiona raz)
+PRECOMPRESS_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".html")
+HASH_LENGTH = 12
+
+# kodowanie -> (sufiks ETag, rozszerzenie pliku skompresowanego)
+ENCODINGS = {"br": ("-br", ".br"), "gzip": ("-gz", ".gz")}
+
+_HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % HASH_LENGTH)
+_ETAG_SUFFIX = re.compile(r'(-br|-gz)"')
+
+_lock = threading.Lock()
+_hashes = {}              # nazwa pliku -> (mtime_ns, rozmiar, hash)
+
+
+def _compress(encoding, data):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def available_encodings():
+    """Kodowania obsługiwane przez serwer, w kolejności preferencji"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def accepted_encoding(encodings):
+    """Najlepsze kodowanie z `encodings` akceptowane przez klienta (albo None)"""
+    best = request.accept_encodings.best_match(encodings)
+    return best if best in encodings else None
+
+
+# ——— kompresja odpowiedzi ———
+
+def _strip_etag_suffix():
+    """If-None-Match z sufiksem kodowania -> ETag widoku (sufiks zapamiętany dla 304)"""
+    raw = request.environ.get("HTTP_IF_NONE_MATCH")
+    if raw and _ETAG_SUFFIX.search(raw):
+        g._etag_suffix = _ETAG_SUFFIX.search(raw).group(1)
+        request.environ["HTTP_IF_NONE_MATCH"] = _ETAG_SUFFIX.sub('"', raw)
+
+
+def _compress_response(response):
+    if response.status_code == 304:
+        # 304 ma ten sam ETag co przechowana (skompresowana) odpowiedź
+        suffix = g.get("_etag_suffix")
+        etag, weak = response.get_etag()
+        if suffix and etag:
+            response.set_etag(etag + suffix, weak)
+        return response
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code == 204 or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = accepted_encoding(available_encodings())
+    if encoding is None:
+        return response
+    response.set_data(_compress(encoding, body))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag + ENCODINGS[encoding][0], weak)
+    return response
+
+
+# ——— pliki statyczne z hashem w nazwie ———
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def content_hash(static_folder, filename):
+    """Hash treści pliku statycznego (None, jeśli pliku nie ma).
+
+    Wynik jest pamiętany per (mtime, rozmiar), więc po zmianie pliku (tryb
+    deweloperski) adres zmienia się bez restartu, a w produkcji kosztuje
+    tylko stat().
+    """
+    path = os.path.join(static_folder, filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    cached = _hashes.get(filename)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    digest = file_hash(path)
+    with _lock:
+        _hashes[filename] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def hashed_filename(static_folder, filename):
+    digest = content_hash(static_folder, filename)
+    if digest is None:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def _precompressed(static_folder, filename):
+    """Gotowe wersje .br/.gz pliku, nie starsze od oryginału: {kodowanie: nazwa}"""
+    source = os.path.join(static_folder, filename)
+    try:
+        source_mtime = os.stat(source).st_mtime_ns
+    except OSError:
+        return {}
+    found = {}
+    for encoding, (_, ext) in ENCODINGS.items():
+        try:
+            # nieaktualny plik pomijamy - lepiej wysłać nieskompresowany niż stary
+            if os.stat(source + ext).st_mtime_ns >= source_mtime:
+                found[encoding] = filename + ext
+        except OSError:
+            pass
+    return found
+
+
+def make_static_view(app):
+    static_folder = app.static_folder
+
+    def send_static(filename):
+        """/static/<plik>: nazwa z aktualnym hashem - cache na rok, inne - z rewalidacją"""
+        if safe_join(static_folder, filename) is None:
+            abort(404)      # ścieżka spoza katalogu static - nie sprawdzamy nawet istnienia
+        immutable = False
+        m = _HASHED_NAME.match(filename)
+        if m and os.path.isfile(os.path.join(static_folder, m["stem"] + m["ext"])):
+            original = m["stem"] + m["ext"]
+            # stary hash (strona sprzed wdrożenia) dostaje aktualny plik, ale bez długiego cache
+            immutable = content_hash(static_folder, original) == m["hash"]
+            filename = original
+
+        variants = _precompressed(static_folder, filename)
+        encoding = accepted_encoding(list(variants)) if variants else None
+        if encoding:
+            response = send_from_directory(static_folder, variants[encoding],
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = send_from_directory(static_folder, filename)
+        if variants:
+            response.vary.add("Accept-Encoding")
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
+
+    return send_static
+
+
+def build_precompressed(static_folder):
+    """Zapisuje .gz (i .br, jeśli jest Brotli) obok plików statycznych; zwraca listę (plik, rozmiary)"""
+    report = []
+    for dirpath, _, files in os.walk(static_folder):
+        for name in sorted(files):
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < COMPRESS_MIN_SIZE:
+                continue
+            sizes = {"raw": len(data)}
+            outputs = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                outputs[".br"] = brotli.compress(data, quality=11)
+            for ext, blob in outputs.items():
+                tmp = path + ext + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp, path + ext)
+                sizes[ext] = len(blob)
+            report.append((os.path.relpath(path, static_folder), sizes))
+    return report
+
+
+def init_app(app):
+    app.before_request(_strip_etag_suffix)
+    app.after_request(_compress_response)
+
+    # url_for('static', filename=...) -> nazwa z hashem treści
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = hashed_filename(app.static_folder, values["filename"])
+
+    app.view_functions["static"] = make_static_view(app)
+
+    @app.cli.command("assets-build")
+    def assets_build_command():
+        """Kompresuje pliki statyczne z góry (.gz/.br) - raz przy wdrożeniu"""
+        for name, sizes in build_precompressed(app.static_folder):
+            parts = ", ".join(f"{ext} {size} B" for ext, size in sizes.items() if ext != "raw")
+            click.echo(f"{name}: {sizes['raw']} B -> {parts}")
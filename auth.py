@@ -1,16 +1,23 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, session, make_response
 from flask_login import LoginManager, login_user, logout_user, login_required, UserMixin, current_user
-from passlib.hash import pbkdf2_sha256
-from models import User, Base, Role
+from sqlalchemy import update
+from models import User, Role
 from db import engine, SessionLocal
 from functools import wraps
+import board_cache
+import user_cache
+import passwords
+from migrations import run_migrations
 
 auth_bp = Blueprint("auth", __name__)
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
 
+# klucz sesji ze znacznikiem bezpieczeństwa z chwili logowania
+SESSION_STAMP_KEY = "_user_stamp"
+
 class UserAdapter(UserMixin):
-    def __init__(self, u: User):
+    def __init__(self, u: user_cache.UserSnapshot):
         self.u = u
     @property
     def id(self): return str(self.u.id)
@@ -20,12 +27,30 @@ class UserAdapter(UserMixin):
     def email(self): return self.u.email
     @property
     def full_name(self): return self.u.full_name
+    @property
+    def is_active(self): return self.u.is_active
 
 @login_manager.user_loader
 def load_user(user_id):
-    with SessionLocal() as db:
-        u = db.get(User, int(user_id))
-        return UserAdapter(u) if u else None
+    uid = int(user_id)
+    stamp = session.get(SESSION_STAMP_KEY, "")
+    u = user_cache.get(SessionLocal, uid)
+    if u is not None and u.security_stamp != stamp:
+        # zmiana mogła nastąpić w innym workerze - sprawdź w bazie
+        u = user_cache.get(SessionLocal, uid, fresh=True)
+    if u is None or not u.is_active or u.security_stamp != stamp:
+        return None
+    return UserAdapter(u)
+
+def user_changed(u: User):
+    """Wołać po zapisaniu zmian użytkownika (commit) - unieważnia lokalny cache.
+
+    Przy zmianie własnego konta odświeżamy znacznik w sesji, żeby nie
+    wylogować samego siebie.
+    """
+    user_cache.invalidate(u.id)
+    if current_user.is_authenticated and current_user.id == str(u.id):
+        session[SESSION_STAMP_KEY] = u.security_stamp or ""
 
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
@@ -33,10 +58,29 @@ def login():
         email = request.form.get("email", "").strip().lower()
         password = request.form.get("password", "")
         with SessionLocal() as db:
-            u = db.query(User).filter(User.email == email, User.is_active == True).first()
-            if u and pbkdf2_sha256.verify(password, u.password_hash):
-                login_user(UserAdapter(u))
-                return redirect(url_for("dashboard"))
+            # wyszukiwanie po unikalnym indeksie e-mail; aktywność sprawdzamy na wierszu
+            u = db.query(User).filter(User.email == email).first()
+            snap, password_hash = (user_cache.snapshot(u), u.password_hash) if u else (None, None)
+        # hashowanie trwa - połączenie z bazą wraca do puli, zanim zaczniemy
+        if snap and snap.is_active:
+            try:
+                ok, new_hash = passwords.verifier.verify(password, password_hash)
+            except passwords.VerifierBusy:
+                flash("Zbyt wiele logowań naraz - spróbuj ponownie za chwilę", "warning")
+                response = make_response(render_template("login.html"), 429)
+                response.headers["Retry-After"] = str(passwords.RETRY_AFTER)
+                return response
+        else:
+            ok, new_hash = False, None
+        if ok:
+            if new_hash:
+                # nowa polityka hashowania - zapis bez zdarzeń ORM, żeby nie zmieniać security_stamp
+                with SessionLocal() as db:
+                    db.execute(update(User).where(User.id == snap.id).values(password_hash=new_hash))
+                    db.commit()
+            login_user(UserAdapter(snap))
+            session[SESSION_STAMP_KEY] = snap.security_stamp
+            return redirect(url_for("dashboard"))
         flash("Błędny login lub hasło", "error")
     return render_template("login.html")
 
@@ -47,15 +91,16 @@ def logout():
     return redirect(url_for("auth.login"))
 
 def init_db_and_admin():
-    Base.metadata.create_all(engine)
+    run_migrations(engine)
     from os import getenv
     admin_email = getenv("ADMIN_EMAIL", "admin@example.com").lower()
     admin_pass = getenv("ADMIN_PASSWORD", "Admin123!")
     with SessionLocal() as db:
         if not db.query(User).filter_by(email=admin_email).first():
             admin = User(email=admin_email, full_name="Administrator",
-                         password_hash=pbkdf2_sha256.hash(admin_pass), role=Role.ADMIN)
+                         password_hash=passwords.hash_password(admin_pass), role=Role.ADMIN)
             db.add(admin); db.commit()
+        board_cache.ensure_state(db)
 
 def require_roles(*roles):
     def wrapper(fn):
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Mikro-benchmark budowania tablicy (board.build_board): czas i pamięć.
+
+Na świeżej bazie SQLite tworzy N rekordów jednego dnia i porównuje
+board.build_board (kolumny -> BoardRow, kolejność z ORDER BY) z poprzednią
+wersją opartą o pełne obiekty Load i sortowanie pasów w Pythonie
+(legacy_build_board poniżej - kopia sprzed zmiany, tylko do porównania).
+Sprawdza też, że obie dają tę samą tablicę.
+
+    python benchmarks/bench_board.py
+    python benchmarks/bench_board.py --sizes 10000 100000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAY = date(2025, 3, 3)
+
+
+def legacy_build_board(db, filter_time=None, day=None, shift=None):
+    """Poprzednia implementacja: obiekty ORM, sortowanie seq w każdym pasie"""
+    from models import Load
+    q = db.query(Load).order_by(Load.time_slot, Load.lane, Load.seq)
+    if day:
+        q = q.filter(Load.ship_day == day)
+    board = {}
+    for r in q.all():
+        ts = r.time_slot or "-"
+        data = board.setdefault(ts, {"trailers": set(), "lanes": {}})
+        if "ship_date" not in data or (getattr(r, "ship_date", "") and not data["ship_date"]):
+            data["ship_date"] = getattr(r, "ship_date", "")
+        if r.trailer_no:
+            data["trailers"].add(r.trailer_no)
+        data["lanes"].setdefault((r.lane or "L01").upper(), []).append(r)
+    fixed_lanes = ["L01", "L02", "L03"]
+    for ts, data in board.items():
+        data["trailer_text"] = ", ".join(sorted(data["trailers"])) if data["trailers"] else "00000000"
+        data["lanes"] = {ln: data["lanes"].get(ln, []) for ln in fixed_lanes}
+        data["headers"] = {}
+        for ln in fixed_lanes:
+            first = data["lanes"][ln][0] if data["lanes"][ln] else None
+            data["headers"][ln] = {
+                "trailer": first.trailer_no or "00000000", "status": first.status or "PL",
+                "time_slot": first.time_slot or ts, "ship_date": getattr(first, "ship_date", "") or "",
+            } if first else {"trailer": "00000000", "status": "PL", "time_slot": ts,
+                             "ship_date": data.get("ship_date", "") or ""}
+
+        def seq_key(row):
+            v = getattr(row, "seq", None)
+            try:
+                return (v is None, int(v))
+            except Exception:
+                return (True, 10 ** 9)
+
+        for ln in fixed_lanes:
+            data["lanes"][ln].sort(key=seq_key)
+    return board
+
+
+def seed(n):
+    from sqlalchemy import insert
+    from db import SessionLocal
+    from models import Load, Shift
+    from auth import init_db_and_admin
+    init_db_and_admin()
+    rows = [{
+        "time_slot": f"{6 + i % 16:02d}:00", "lane": f"L{1 + (i // 16) % 3:02d}", "seq": (i * 7919) % 5000,
+        "area": f"A{i % 24:02d}", "planned": 10, "done": i % 10, "lo_code": f"LO{i}", "picker": f"p{i % 40}",
+        "status": "PL", "trailer_no": f"TR{i % 50:03d}", "ship_date": DAY.strftime("%d.%m.%Y"), "ship_day": DAY,
+        "shift": Shift.A, "created_by_id": 1, "notes": "x" * 200, "order_no": f"ORD-{i}",
+        "vehicle_no": f"V{i}", "payload_tons": 12.5,
+    } for i in range(n)]
+    with SessionLocal() as db:
+        for i in range(0, n, 5000):
+            db.execute(insert(Load.__table__), rows[i:i + 5000])
+        db.commit()
+
+
+def measure(fn, repeat):
+    from db import SessionLocal
+    times, peaks = [], []
+    for _ in range(repeat):
+        with SessionLocal() as db:
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            board = fn(db, day=DAY)
+            times.append(time.perf_counter() - t0)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return statistics.median(times) * 1000, max(peaks) / 1e6, board
+
+
+def shape(board):
+    """Porównywalna postać tablicy: id w pasach, nagłówki, naczepy, data"""
+    return {ts: ({ln: [r.id for r in rows] for ln, rows in d["lanes"].items()},
+                 d["headers"], d["trailer_text"], d["ship_date"]) for ts, d in board.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark budowania tablicy")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="liczby rekordów")
+    parser.add_argument("--repeat", type=int, default=3, help="pomiary na wariant (mediana czasu)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-board-")
+    # każdy rozmiar w osobnym procesie: własna baza i czysta pamięć
+    if os.getenv("BENCH_BOARD_SIZE"):
+        n = int(os.getenv("BENCH_BOARD_SIZE"))
+        seed(n)
+        import board
+        new_ms, new_mb, new = measure(board.build_board, args.repeat)
+        old_ms, old_mb, old = measure(legacy_build_board, args.repeat)
+        same = shape(new) == shape(old)
+        print(f"{n:>7} rekordów | ORM Load: {old_ms:8.1f} ms {old_mb:7.1f} MB | "
+              f"BoardRow: {new_ms:8.1f} ms {new_mb:7.1f} MB | x{old_ms / new_ms:.1f} czas, "
+              f"x{old_mb / new_mb:.1f} pamięć | ta sama tablica: {'tak' if same else 'NIE'}")
+        return
+
+    import subprocess
+    for n in args.sizes:
+        env = dict(os.environ, BENCH_BOARD_SIZE=str(n),
+                   DATABASE_URL=f"sqlite:///{workdir}/board-{n}.db")
+        env.pop("DATABASE_READ_URL", None)
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--repeat", str(args.repeat)],
+                       env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
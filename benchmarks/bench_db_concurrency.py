@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark współbieżności bazy: N wątków czyta tablicę, M wątków zapisuje.
+
+Domyślnie tworzy tymczasową bazę SQLite, więc można porównać tryby dziennika:
+
+    python benchmarks/bench_db_concurrency.py                    # WAL (domyślnie)
+    python benchmarks/bench_db_concurrency.py --journal delete   # stary rollback journal
+    DATABASE_URL=postgresql://... python benchmarks/bench_db_concurrency.py --keep-url
+
+Raportuje odczyty/s, zapisy/s i liczbę błędów "database is locked".
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark równoległych odczytów i zapisów")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=300, help="liczba rekordów na tablicy")
+    parser.add_argument("--journal", choices=["wal", "delete"], default="wal", help="tryb dziennika SQLite")
+    parser.add_argument("--keep-url", action="store_true", help="użyj DATABASE_URL zamiast tymczasowej bazy")
+    args = parser.parse_args(argv)
+
+    # konfiguracja silnika jest czytana przy imporcie db.py
+    if not args.keep_url:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ["SQLITE_WAL"] = "1" if args.journal == "wal" else "0"
+
+    from sqlalchemy.exc import OperationalError
+    from db import SessionLocal, engine, DATABASE_URL
+    from models import Load, Shift, User
+    from auth import init_db_and_admin
+    from loads import build_board
+    import board_cache
+
+    init_db_and_admin()
+    with SessionLocal() as db:
+        if not db.query(Load).count():
+            owner = db.query(User.id).first()[0]
+            db.add_all([Load(time_slot=f"{16 + i % 6}:00", lane=f"L{1 + i % 12:02d}", area="A", seq=i,
+                             planned=10, done=0, status="PL", shift=Shift.A, created_by_id=owner) for i in range(args.rows)])
+            board_cache.bump_version(db)
+            db.commit()
+        ids = [i for (i,) in db.query(Load.id).all()]
+
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def add(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        while not stop.is_set():
+            with SessionLocal() as db:
+                build_board(db)
+            add("reads")
+
+    def writer():
+        while not stop.is_set():
+            try:
+                with SessionLocal() as db:
+                    l = db.get(Load, random.choice(ids))
+                    l.done = (l.done or 0) + 1
+                    board_cache.stamp(db, l)
+                    db.commit()
+                add("writes")
+            except OperationalError:
+                add("locked")
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    print(f"{engine.dialect.name} ({args.journal if DATABASE_URL.startswith('sqlite') else 'server'}), "
+          f"{args.readers} odczytujących + {args.writers} zapisujących, {elapsed:.1f} s")
+    print(f"odczyty: {counts['reads']} ({counts['reads'] / elapsed:.1f}/s), "
+          f"zapisy: {counts['writes']} ({counts['writes'] / elapsed:.1f}/s), "
+          f"błędy blokady: {counts['locked']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Mikro-benchmark logowania: czas weryfikacji hasła i przepustowość puli.
+
+Używa bieżącej konfiguracji z passwords.py (PASSWORD_ROUNDS,
+LOGIN_VERIFY_WORKERS, LOGIN_VERIFY_QUEUE), więc porównanie ustawień to
+po prostu uruchomienie ze zmienionymi zmiennymi środowiskowymi:
+
+    python benchmarks/bench_login.py
+    PASSWORD_ROUNDS=100000 LOGIN_VERIFY_WORKERS=4 python benchmarks/bench_login.py --clients 60
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import passwords
+
+
+def bench_latency(password_hash, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        passwords.verify_and_update("Haslo123", password_hash)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+        "max_ms": samples[-1],
+    }
+
+
+def bench_burst(password_hash, clients, per_client):
+    """`clients` wątków loguje się jednocześnie; liczymy udane i odrzucone (429)"""
+    ok, busy = [0], [0]
+    lock = threading.Lock()
+    start = threading.Barrier(clients)
+
+    def client():
+        start.wait()
+        for _ in range(per_client):
+            try:
+                passwords.verifier.verify("Haslo123", password_hash)
+                with lock:
+                    ok[0] += 1
+            except passwords.VerifierBusy:
+                with lock:
+                    busy[0] += 1
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return {"ok": ok[0], "rejected_429": busy[0], "seconds": elapsed, "logins_per_s": ok[0] / elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark weryfikacji haseł")
+    parser.add_argument("--samples", type=int, default=30, help="liczba pomiarów pojedynczej weryfikacji")
+    parser.add_argument("--clients", type=int, default=60, help="liczba równoczesnych logowań")
+    parser.add_argument("--per-client", type=int, default=1, help="logowań na klienta")
+    args = parser.parse_args(argv)
+
+    h = passwords.hash_password("Haslo123")
+    print(f"rounds={passwords.PASSWORD_ROUNDS} workers={passwords.verifier.workers} "
+          f"queue={passwords.LOGIN_VERIFY_QUEUE} cpu={os.cpu_count()}")
+
+    lat = bench_latency(h, args.samples)
+    print(f"verify: p50 {lat['p50_ms']:.1f} ms, p95 {lat['p95_ms']:.1f} ms, max {lat['max_ms']:.1f} ms "
+          f"(~{1000 / lat['p50_ms']:.0f} logowań/s na rdzeń)")
+
+    burst = bench_burst(h, args.clients, args.per_client)
+    print(f"burst {args.clients} klientów: {burst['ok']} OK, {burst['rejected_429']} odrzuconych (429), "
+          f"{burst['seconds']:.2f} s, {burst['logins_per_s']:.1f} logowań/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Test obciążenia `/loads`: serwer deweloperski Flaska kontra gunicorn.
+
+Dla każdego wariantu skrypt przygotowuje własną bazę SQLite z tablicą
+(--loads rekordów), uruchamia serwer na wolnym porcie, loguje klientów
+i przez --seconds sekund odpytuje `/loads` z --clients wątków (każdy na
+własnym połączeniu keep-alive). Wynik: żądania/s, p50 i p95 opóźnienia.
+
+    python benchmarks/bench_serving.py
+    python benchmarks/bench_serving.py --server gunicorn --clients 32 --seconds 20
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=8 python benchmarks/bench_serving.py
+
+Klienci nie wysyłają If-None-Match, więc każde żądanie renderuje tablicę
+(z cache tablicy, bez 304) - to najgorszy przypadek dla ekranów.
+"""
+import argparse
+import http.client
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+SERVERS = {
+    "dev": [sys.executable, "app.py"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed(env, n):
+    """Schemat, admin i n rekordów na bieżący dzień operacyjny (osobny proces - własna baza)"""
+    code = f"""
+import sys; sys.path.insert(0, {ROOT!r})
+from app import bootstrap
+bootstrap()
+from db import SessionLocal
+from models import Load, Shift, User
+import board_cache, events
+with SessionLocal() as db:
+    owner = db.query(User).first().id
+    loads = [Load(time_slot=f"{{16 + i % 6}}:00", lane=f"L{{1 + i % 12:02d}}", seq=i // 72, area="A",
+                  planned=10, done=i % 10, status="PL", shift=Shift.A, created_by_id=owner)
+             for i in range({n})]
+    db.add_all(loads)
+    events.record(db, board_cache.stamp(db, *loads), "reset")
+    db.commit()
+"""
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def wait_ready(port, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("serwer zakończył się przy starcie")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("serwer nie odpowiada")
+
+
+def login(port, email, password):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("POST", "/login", urlencode({"email": email, "password": password}),
+                 {"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse()
+    resp.read()
+    cookie = resp.getheader("Set-Cookie", "").split(";", 1)[0]
+    if resp.status != 302 or not cookie:
+        raise RuntimeError(f"logowanie nie powiodło się ({resp.status})")
+    return conn, cookie
+
+
+def run_load(port, clients, seconds, cookie):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    start = threading.Barrier(clients + 1)
+    stop_at = [0.0]
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        start.wait()
+        while time.perf_counter() < stop_at[0]:
+            t0 = time.perf_counter()
+            try:
+                conn.request("GET", "/loads", headers={"Cookie": cookie})
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            if ok:
+                local.append(time.perf_counter() - t0)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    t0 = time.perf_counter()
+    stop_at[0] = t0 + seconds
+    start.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+    }
+
+
+def bench(server, args):
+    workdir = tempfile.mkdtemp(prefix=f"bench-{server}-")
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+               SECRET_KEY_FILE=os.path.join(workdir, "secret_key"),
+               METRICS_DIR=os.path.join(workdir, "metrics"), LOG_LEVEL="WARNING")
+    env.pop("DATABASE_READ_URL", None)
+    env.pop("FLASK_ENV", None)
+    seed(env, args.loads)
+
+    proc = subprocess.Popen(SERVERS[server], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        wait_ready(port, proc)
+        _, cookie = login(port, "admin@example.com", "Admin123!")
+        run_load(port, min(args.clients, 4), 1, cookie)     # rozgrzewka (cache tablicy, połączenia)
+        return run_load(port, args.clients, args.seconds, cookie)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test obciążenia /loads: dev server vs gunicorn")
+    parser.add_argument("--server", choices=["dev", "gunicorn", "both"], default="both")
+    parser.add_argument("--clients", type=int, default=16, help="równoczesnych klientów")
+    parser.add_argument("--seconds", type=float, default=10, help="czas pomiaru")
+    parser.add_argument("--loads", type=int, default=300, help="rekordów na tablicy")
+    args = parser.parse_args(argv)
+
+    servers = ["dev", "gunicorn"] if args.server == "both" else [args.server]
+    print(f"/loads: {args.clients} klientów, {args.seconds:g} s, {args.loads} rekordów, CPU={os.cpu_count()}")
+    for server in servers:
+        r = bench(server, args)
+        print(f"{server:9s} {r['rps']:8.1f} req/s   p50 {r['p50_ms']:7.1f} ms   p95 {r['p95_ms']:7.1f} ms   "
+              f"({r['requests']} żądań, {r['errors']} błędów)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark startu workera: czas importu aplikacji i pamięć (RSS) procesu.
+
+Każdy pomiar uruchamia świeży interpreter (jak nowy worker gunicorna), który
+importuje obiekt aplikacji wskazany przez --target. Raport podaje medianę
+czasu importu i RSS, a także:
+- liczbę połączeń z bazą nawiązanych przy starcie (powinno być 0),
+- które z ciężkich modułów (pandas, numpy, openpyxl, pyarrow) zostały
+  załadowane - powinny ładować się dopiero przy pierwszym żądaniu, które
+  ich potrzebuje.
+
+Domyślnie każdy proces dostaje pustą bazę SQLite w katalogu tymczasowym;
+--keep-url zostawia DATABASE_URL ze środowiska.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --target "app:create_app()"
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "pyarrow"]
+
+# kod uruchamiany w procesie-workerze; wynik jako jedna linia JSON na stdout
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+from sqlalchemy import event
+import db
+connects = []
+for e in {{db.engine, db.read_engine}}:
+    event.listen(e, "connect", lambda *a: connects.append(1))
+t_db = time.perf_counter()
+module, _, attr = {target!r}.partition(":")
+mod = __import__(module)
+app = eval(attr or "app", vars(mod))
+elapsed = time.perf_counter() - t0
+rss_kb = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss_kb = int(line.split()[1])
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "rss_mb": rss_kb / 1024,
+    "db_connects": len(connects),
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def probe(target, env):
+    code = PROBE.format(root=ROOT, target=target, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark startu workera (import + RSS)")
+    parser.add_argument("--runs", type=int, default=5, help="liczba świeżych procesów")
+    parser.add_argument("--target", default="app:app", help="moduł:obiekt aplikacji (jak dla gunicorna)")
+    parser.add_argument("--keep-url", action="store_true",
+                        help="użyj DATABASE_URL ze środowiska (domyślnie pusta baza SQLite w katalogu tymczasowym)")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if not args.keep_url:
+        env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+        env.pop("DATABASE_READ_URL", None)
+
+    runs = [probe(args.target, env) for _ in range(args.runs)]
+    times = sorted(r["import_ms"] for r in runs)
+    rss = sorted(r["rss_mb"] for r in runs)
+    last = runs[-1]
+    print(f"target={args.target} runs={args.runs} python={sys.version.split()[0]}")
+    print(f"import: median {statistics.median(times):.0f} ms, min {times[0]:.0f} ms, max {times[-1]:.0f} ms")
+    print(f"RSS po starcie: median {statistics.median(rss):.1f} MB, max {rss[-1]:.1f} MB")
+    print(f"modułów: {last['modules']}, ciężkie moduły: {', '.join(last['heavy']) or 'brak'}")
+    print(f"połączenia z bazą przy starcie: {max(r['db_connects'] for r in runs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# board.py
+"""
+Budowanie tablicy dla /loads: slot -> pasy L01-L03 -> wiersze.
+
+Zapytanie wybiera tylko kolumny, których używa szablon, do lekkich krotek
+BoardRow (namedtuple, bez obiektów ORM, mapy tożsamości i kolumn typu
+notes/order_no/payload_tons). Kolejność - slot, pas (wielkimi literami,
+brak = L01), seq z pustymi na końcu - daje ORDER BY w SQL, więc w Pythonie
+wiersze są tylko rozkładane do pasów w jednym przejściu, bez sortowania.
+"""
+from collections import namedtuple
+from sqlalchemy import select, func
+from models import Load
+
+FIXED_LANES = ("L01", "L02", "L03")
+DEFAULT_LANE = "L01"
+DEFAULT_SLOT = "17:00"
+EMPTY_TRAILER = "00000000"
+
+BoardRow = namedtuple("BoardRow", [
+    "id", "time_slot", "lane", "seq", "area", "planned", "done",
+    "lo_code", "picker", "status", "trailer_no", "ship_date",
+])
+
+# pas znormalizowany w SQL - ten sam klucz służy do sortowania i grupowania
+LANE_KEY = func.coalesce(func.upper(Load.lane), DEFAULT_LANE)
+
+
+def board_query(filter_time=None, day=None, shift=None):
+    """SELECT kolumn tablicy w kolejności wyświetlania.
+
+    `day` ogranicza tablicę do jednego dnia operacyjnego (indeks ix_loads_day_board),
+    więc czas zapytania zależy od dzisiejszego wolumenu, a nie od całej historii.
+    """
+    q = select(
+        Load.id, Load.time_slot, LANE_KEY.label("lane"), Load.seq, Load.area, Load.planned, Load.done,
+        Load.lo_code, Load.picker, Load.status, Load.trailer_no, Load.ship_date,
+    ).order_by(Load.time_slot, LANE_KEY, Load.seq.asc().nulls_last(), Load.id)
+    if day:
+        q = q.where(Load.ship_day == day)
+    if filter_time:
+        q = q.where(Load.time_slot == filter_time)
+    if shift:
+        q = q.where(Load.shift == shift)
+    return q
+
+
+def _empty_slot(ship_date=""):
+    return {"trailers": set(), "lanes": {ln: [] for ln in FIXED_LANES}, "ship_date": ship_date}
+
+
+def _header(first, ts, data):
+    """Nagłówek karty pasa z pierwszego wiersza (albo wartości domyślne dla pustego pasa)"""
+    if first is None:
+        return {"trailer": EMPTY_TRAILER, "status": "PL", "time_slot": ts, "ship_date": data["ship_date"] or ""}
+    return {
+        "trailer": first.trailer_no or EMPTY_TRAILER,
+        "status": first.status or "PL",
+        "time_slot": first.time_slot or ts,
+        "ship_date": first.ship_date or "",
+    }
+
+
+def build_board(db, filter_time=None, day=None, shift=None):
+    """Rekordy z bazy jako struktura tablicy:
+    {slot: {"lanes": {pas: [BoardRow]}, "headers", "trailers", "trailer_text", "ship_date"}}"""
+    board = {}
+    for r in map(BoardRow._make, db.execute(board_query(filter_time, day, shift))):
+        ts = r.time_slot or "-"
+        data = board.get(ts)
+        if data is None:
+            data = board[ts] = _empty_slot(r.ship_date)
+        elif r.ship_date and not data["ship_date"]:
+            data["ship_date"] = r.ship_date
+        if r.trailer_no:
+            data["trailers"].add(r.trailer_no)
+        # pasy spoza L01-L03 nie mają karty na tablicy (ich naczepy liczą się do slotu)
+        rows = data["lanes"].get(r.lane)
+        if rows is not None:
+            rows.append(r)
+
+    # pusta baza - jeden domyślny slot, żeby tablica miała karty do wypełnienia
+    if not board:
+        board[DEFAULT_SLOT] = _empty_slot()
+
+    for ts, data in board.items():
+        data["trailer_text"] = ", ".join(sorted(data["trailers"])) if data["trailers"] else EMPTY_TRAILER
+        data["headers"] = {ln: _header(rows[0] if rows else None, ts, data) for ln, rows in data["lanes"].items()}
+    return board
@@ -0,0 +1,171 @@
+# board_cache.py
+"""
+Współdzielony cache zbudowanej tablicy (board).
+
+Każdy zapis do `loads` podbija wersję w tabeli `board_state` w tej samej
+transakcji co zmiana danych. Odczyt tablicy pobiera tylko ten jeden wiersz
+(po kluczu głównym) i jeśli wersja się nie zmieniła, zwraca gotowy board
+z pamięci procesu - bez skanowania `loads` i grupowania w Pythonie.
+Dzięki temu unieważnienie działa między wieloma workerami gunicorna.
+
+Drugi poziom to cache HTML kart pasów (get_fragment): kluczem jest treść
+karty (jej wiersze i nagłówek), więc po edycji jednego pasa ponownie
+renderowana jest tylko ta karta - pozostałe mają ten sam klucz co przed
+zmianą, także po podbiciu wersji tablicy.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import select, update, insert, literal
+from models import BoardState, Load, LoadTombstone
+
+BOARD_STATE_ID = 1
+MAX_ENTRIES = 64          # ile wariantów (filtrów) trzymamy na proces
+MAX_CHANGES = 500         # powyżej tej liczby zmian klient przeładowuje całą tablicę
+FRAGMENT_ENTRIES = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))   # kart pasów na proces
+
+_lock = threading.Lock()
+_cache = {}               # klucz filtra -> (wersja, board)
+_fragments = OrderedDict()   # klucz karty -> HTML (LRU)
+
+
+def current_version(db) -> int:
+    """Aktualna wersja tablicy (0 jeśli wiersz jeszcze nie istnieje)"""
+    v = db.scalar(select(BoardState.version).where(BoardState.id == BOARD_STATE_ID))
+    return v or 0
+
+
+def bump_version(db) -> int:
+    """Podbija wersję tablicy w bieżącej transakcji i zwraca nową wartość.
+
+    Wołać przed `db.commit()` w każdej ścieżce, która zmienia `loads`.
+    """
+    res = db.execute(
+        update(BoardState)
+        .where(BoardState.id == BOARD_STATE_ID)
+        .values(version=BoardState.version + 1)
+    )
+    if res.rowcount == 0:
+        db.add(BoardState(id=BOARD_STATE_ID, version=1))
+        db.flush()
+        return 1
+    return current_version(db)
+
+
+def stamp(db, *loads) -> int:
+    """Podbija wersję i oznacza podane rekordy jako zmienione w tej wersji"""
+    version = bump_version(db)
+    now = datetime.utcnow()
+    for l in loads:
+        l.revision = version
+        l.updated_at = now
+    return version
+
+
+def record_deletes(db, loads, version):
+    """Zapisuje tombstone dla każdego usuwanego rekordu"""
+    now = datetime.utcnow()
+    db.add_all([
+        LoadTombstone(load_id=l.id, revision=version, time_slot=l.time_slot,
+                      lane=l.lane, area=l.area, ship_day=l.ship_day, deleted_at=now)
+        for l in loads
+    ])
+
+
+def record_delete_all(db, version, *where):
+    """Tombstone dla wszystkich (albo pasujących do `where`) rekordów naraz.
+
+    INSERT ... SELECT - bez ładowania obiektów ORM.
+    """
+    cols = ["load_id", "revision", "time_slot", "lane", "area", "ship_day", "deleted_at"]
+    db.execute(insert(LoadTombstone).from_select(cols, select(
+        Load.id, literal(version), Load.time_slot, Load.lane, Load.area, Load.ship_day,
+        literal(datetime.utcnow()),
+    ).where(*where)))
+
+
+def changes_since(db, since: int):
+    """Rekordy zmienione i usunięte po wersji `since`.
+
+    Zwraca (kursor, zmienione, usunięte, reset). `reset=True` oznacza, że
+    klient powinien przeładować całą tablicę (za dużo zmian, kursor starszy
+    niż usunięte przez retencję tombstone albo kursor z przyszłości, np. po
+    odtworzeniu bazy).
+    """
+    state = db.get(BoardState, BOARD_STATE_ID)
+    cursor = state.version if state else 0
+    if since > cursor or (state and since < (state.pruned_revision or 0)):
+        return cursor, [], [], True
+
+    changed = db.scalars(
+        select(Load).where(Load.revision > since).order_by(Load.revision).limit(MAX_CHANGES + 1)
+    ).all()
+    deleted = db.scalars(
+        select(LoadTombstone).where(LoadTombstone.revision > since)
+        .order_by(LoadTombstone.revision).limit(MAX_CHANGES + 1)
+    ).all()
+    if len(changed) + len(deleted) > MAX_CHANGES:
+        return cursor, [], [], True
+    return cursor, changed, deleted, False
+
+
+def ensure_state(db):
+    """Tworzy wiersz wersji, jeśli go brak (wołane przy inicjalizacji bazy)"""
+    if db.get(BoardState, BOARD_STATE_ID) is None:
+        db.add(BoardState(id=BOARD_STATE_ID, version=0))
+        db.commit()
+
+
+def get_board(db, key, build):
+    """Zwraca (wersja, board) dla danego klucza filtra.
+
+    `build(db)` jest wołane tylko wtedy, gdy w cache brak wpisu dla bieżącej
+    wersji. Wersję czytamy PRZED budowaniem, więc w razie równoległego zapisu
+    board najwyżej zostanie przebudowany przy następnym żądaniu - nigdy nie
+    zostanie oznaczony nowszą wersją niż dane, z których powstał.
+    """
+    version = current_version(db)
+    hit = _cache.get(key)
+    if hit is not None and hit[0] == version:
+        return version, hit[1]
+
+    board = build(db)
+    with _lock:
+        if key not in _cache and len(_cache) >= MAX_ENTRIES:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = (version, board)
+    return version, board
+
+
+def lane_key(data, lane, *variant):
+    """Klucz karty pasa: wszystko, co widać na karcie (wiersze, nagłówek, data, naczepy slotu).
+
+    Wiersze to krotki BoardRow, więc porównanie klucza porównuje treść, a nie
+    tylko skrót - dwie różne karty nigdy nie dostaną tego samego HTML.
+    """
+    return variant + (lane, tuple(data["lanes"][lane]), tuple(data["headers"][lane].items()),
+                      data["ship_date"], data["trailer_text"])
+
+
+def get_fragment(key, render):
+    """Zwraca (html, trafienie). `render()` jest wołane tylko przy braku wpisu."""
+    with _lock:
+        html = _fragments.get(key)
+        if html is not None:
+            _fragments.move_to_end(key)
+            return html, True
+
+    html = render()
+    with _lock:
+        _fragments[key] = html
+        while len(_fragments) > FRAGMENT_ENTRIES:
+            _fragments.popitem(last=False)
+    return html, False
+
+
+def clear():
+    """Czyści lokalny cache procesu (np. w testach)"""
+    with _lock:
+        _cache.clear()
+        _fragments.clear()
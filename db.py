@@ -1,21 +1,158 @@
 # db.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, Session
 import os
+import time
 
 # Użyj PostgreSQL na serwerze, SQLite lokalnie
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///logitransport.db")
+# Opcjonalna replika tylko do odczytu (np. druga baza PostgreSQL albo kopia pliku SQLite)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or None
+# Przez tyle sekund po własnym zapisie użytkownik czyta z bazy głównej
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
 
-# Konfiguracja silnika bazy danych
-if DATABASE_URL.startswith("sqlite"):
-    # SQLite - wyłącz check_same_thread dla Flask
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+
+# PostgreSQL - pula połączeń (na worker gunicorna)
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)          # sekundy czekania na wolne połączenie
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)        # sekundy; krócej niż timeout po stronie serwera/proxy
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)     # wykrywa zerwane połączenia przed użyciem
+
+# SQLite - pragmy ustawiane na każdym nowym połączeniu
+SQLITE_WAL = _env_bool("SQLITE_WAL", True)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = _env_int("SQLITE_CACHE_SIZE_KB", 20000)
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+
+
+def _sqlite_in_memory(url):
+    """Baza w pamięci (sqlite://, :memory:, file:...?mode=memory) - WAL nie ma tam sensu"""
+    database = url.database or ""
+    return database in ("", ":memory:") or url.query.get("mode") == "memory" or "mode=memory" in database
+
+
+def _sqlite_pragmas(wal):
+    """Listener "connect" dla silnika SQLite; `wal` wynika z URL-a tego silnika.
+
+    WAL: odczyty nie blokują zapisu (i odwrotnie); busy_timeout: zapis czeka
+    na zwolnienie blokady zamiast od razu zwracać "database is locked".
+    """
+    def on_connect(dbapi_conn, connection_record):
+        cur = dbapi_conn.cursor()
+        try:
+            if wal:
+                cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            if SQLITE_SYNCHRONOUS in ("OFF", "NORMAL", "FULL", "EXTRA"):
+                cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        finally:
+            cur.close()
+    return on_connect
+
+
+def make_engine(url):
+    """Silnik z konfiguracją puli (PostgreSQL) albo pragmami (SQLite)"""
+    if url.startswith("sqlite"):
+        # SQLite - wyłącz check_same_thread dla Flask
+        eng = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            future=True,
+        )
+        # decyzja na podstawie URL-a tego silnika (replika / baza testowa), nie DATABASE_URL
+        event.listen(eng, "connect", _sqlite_pragmas(SQLITE_WAL and not _sqlite_in_memory(eng.url)))
+        return eng
+    # PostgreSQL
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
         future=True,
     )
-else:
-    # PostgreSQL - standardowa konfiguracja
-    engine = create_engine(DATABASE_URL, future=True)
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+# Konfiguracja silnika bazy danych
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
+
+
+def dispose_after_fork():
+    """Po fork() (gunicorn post_fork, pula procesów jobs.py): porzuca pule połączeń
+    odziedziczone po rodzicu - bez zamykania gniazd, których rodzic nadal używa"""
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+
+
+class RoutingSession(Session):
+    """Sesja, która w trybie tylko-do-odczytu kieruje SELECT-y do repliki.
+
+    Zapisy (flush, INSERT/UPDATE/DELETE) zawsze idą do bazy głównej.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (self.info.get("replica") and not self._flushing
+                and (clause is None or getattr(clause, "is_select", False))):
+            return read_engine
+        return engine
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, bind=engine, autoflush=False, autocommit=False, future=True)
+
+
+# ——— read-your-writes ———
+# Po zatwierdzonym zapisie zapamiętujemy w sesji HTTP termin, do którego
+# odczyty tego użytkownika idą do bazy głównej (replika może być opóźniona).
+
+RYW_SESSION_KEY = "_ryw_until"
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_write(session):
+    if not session.info.pop("wrote", False) or read_engine is engine:
+        return
+    from flask import has_request_context, session as http_session
+    if has_request_context():
+        http_session[RYW_SESSION_KEY] = time.time() + READ_YOUR_WRITES_SECONDS
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_write(session):
+    session.info.pop("wrote", None)
+
+
+def ReadSession():
+    """Sesja dla widoków tylko do odczytu: replika, chyba że użytkownik
+    niedawno coś zapisał (wtedy baza główna, żeby widział swoją zmianę)."""
+    db = SessionLocal()
+    if read_engine is not engine:
+        from flask import has_request_context, session as http_session
+        recent = has_request_context() and http_session.get(RYW_SESSION_KEY, 0) > time.time()
+        db.info["replica"] = not recent
+    return db
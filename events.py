@@ -0,0 +1,171 @@
+# events.py
+"""
+Zdarzenia zmian tablicy i ich rozsyłanie przez Server-Sent Events.
+
+Trasy zapisujące `loads` wołają `record()` w tej samej transakcji co zmiana,
+więc wiersz w `load_events` pojawia się dokładnie wtedy, gdy zmiana jest
+zatwierdzona. Każdy proces (worker gunicorna) ma jeden wątek `Broadcaster`,
+który co `POLL_INTERVAL` sekund pobiera nowe zdarzenia jednym zapytaniem
+i rozsyła je do wszystkich podłączonych klientów tego procesu.
+
+Każdy klient ma ograniczoną kolejkę. Jeśli klient nie nadąża, kolejka jest
+czyszczona i dostaje on jedno zdarzenie `resync` - wtedy sam dociąga zmiany
+przez /loads/changes. Wolny klient nie trzyma więc w pamięci zaległości.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import select, func, insert, literal
+from db import SessionLocal
+from models import Load, LoadEvent
+
+POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "1.0"))   # sekundy
+HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))             # sekundy
+QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "50"))             # paczek na klienta
+BATCH_LIMIT = 500
+
+log = logging.getLogger("logitrans.sse")
+
+RESYNC = object()   # znacznik: klient ma dociągnąć zmiany przez /loads/changes
+
+
+def record(db, revision, op, load_id=None, time_slot=None, lane=None, fields=None, ship_day=None):
+    """Dopisuje zdarzenie w bieżącej transakcji (bez commit)"""
+    db.add(LoadEvent(
+        revision=revision, op=op, load_id=load_id, time_slot=time_slot, lane=lane,
+        ship_day=ship_day, fields=json.dumps(fields, default=str) if fields else None,
+    ))
+
+
+def record_deletes(db, revision, *where):
+    """Zdarzenie `delete` dla każdego rekordu pasującego do `where` (INSERT ... SELECT)"""
+    cols = ["revision", "op", "load_id", "time_slot", "lane", "ship_day", "created_at"]
+    db.execute(insert(LoadEvent).from_select(cols, select(
+        literal(revision), literal("delete"), Load.id, Load.time_slot, Load.lane, Load.ship_day,
+        literal(datetime.utcnow()),
+    ).where(*where)))
+
+
+def event_to_dict(e):
+    return {
+        "revision": e.revision,
+        "op": e.op,
+        "id": e.load_id,
+        "time_slot": e.time_slot,
+        "lane": e.lane,
+        "ship_day": e.ship_day.isoformat() if e.ship_day else None,
+        "fields": json.loads(e.fields) if e.fields else {},
+    }
+
+
+class Subscriber:
+    """Kolejka jednego klienta SSE z ograniczonym rozmiarem"""
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.q = queue.Queue(maxsize=maxsize)
+
+    def put(self, item):
+        try:
+            self.q.put_nowait(item)
+        except queue.Full:
+            # klient nie nadąża - porzucamy zaległości, niech zsynchronizuje się sam
+            while True:
+                try:
+                    self.q.get_nowait()
+                except queue.Empty:
+                    break
+            self.q.put_nowait(RESYNC)
+
+    def get(self, timeout):
+        return self.q.get(timeout=timeout)
+
+
+class Broadcaster:
+    """Jeden wątek na proces: odpytuje `load_events` i rozsyła do subskrybentów"""
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._last_id = None
+
+    def subscribe(self):
+        sub = Subscriber()
+        with self._lock:
+            self._subs.add(sub)
+            self._ensure_thread()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def client_count(self):
+        return len(self._subs)
+
+    def _ensure_thread(self):
+        # wątki nie przeżywają fork() - po starcie workera uruchamiamy go od nowa
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._last_id = None
+        self._thread = threading.Thread(target=self._run, name="sse-broadcaster", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            if not self._subs:
+                continue
+            try:
+                batch = self._fetch()
+            except Exception:
+                log.exception("błąd odczytu zdarzeń")
+                continue
+            if batch:
+                with self._lock:
+                    subs = list(self._subs)
+                for sub in subs:
+                    sub.put(batch)
+
+    def _fetch(self):
+        with SessionLocal() as db:
+            if self._last_id is None:
+                self._last_id = db.scalar(select(func.max(LoadEvent.id))) or 0
+                return None
+            rows = db.scalars(
+                select(LoadEvent).where(LoadEvent.id > self._last_id)
+                .order_by(LoadEvent.id).limit(BATCH_LIMIT)
+            ).all()
+            if not rows:
+                return None
+            self._last_id = rows[-1].id
+            # serializujemy raz na paczkę - ten sam tekst idzie do wszystkich klientów
+            return json.dumps([event_to_dict(e) for e in rows])
+
+
+broadcaster = Broadcaster()
+
+
+def sse_stream(sub, cursor):
+    """Generator strumienia SSE dla jednego klienta"""
+    try:
+        yield f"retry: 5000\nevent: hello\ndata: {json.dumps({'cursor': cursor})}\n\n"
+        while True:
+            try:
+                item = sub.get(timeout=HEARTBEAT)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            if item is RESYNC:
+                yield "event: resync\ndata: {}\n\n"
+            else:
+                yield f"event: changes\ndata: {item}\n\n"
+    finally:
+        broadcaster.unsubscribe(sub)
@@ -0,0 +1,81 @@
+# gunicorn.conf.py
+"""
+Konfiguracja serwera produkcyjnego:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Worker gthread: kilka procesów, w każdym pula wątków. Trasy tablicy to
+głównie czekanie na bazę (I/O), więc wątki dobrze je przeplatają, a
+połączenia SSE (/loads/stream) zajmują tylko wątek, nie cały proces.
+Każdy otwarty ekran z tablicą trzyma jeden wątek przez cały czas połączenia,
+więc liczba wątków wynika z liczby ekranów (GUNICORN_SSE_CLIENTS) plus
+wątków na zwykłe żądania (GUNICORN_REQUEST_THREADS) - inaczej ekrany zajęłyby
+wszystkie wątki, a zwykłe żądania czekałyby w kolejce.
+
+Aplikacja jest ładowana raz w procesie głównym (preload_app) i dzielona
+z workerami przez fork; post_fork odcina odziedziczone połączenia z bazą
+i uruchamia wątek logów w każdym workerze. Workery są co jakiś czas
+wymieniane (max_requests + jitter, żeby nie restartowały się naraz).
+
+Wdrożenie / restart bez zrywania żądań: SIGTERM (tak kończy proces
+Render/Heroku) albo `kill -HUP <master>` - workery kończą bieżące żądania
+w ciągu graceful_timeout. Przy preload_app nowy kod wymaga nowego procesu
+głównego (`kill -USR2 <master>`, potem `kill -TERM` staremu) albo
+zwykłego restartu usługi.
+"""
+import os
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+CPUS = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+worker_class = "gthread"
+# WEB_CONCURRENCY to konwencja Render/Heroku; domyślnie 2 x CPU + 1, z górnym limitem
+workers = _env_int("WEB_CONCURRENCY", min(2 * CPUS + 1, _env_int("GUNICORN_MAX_WORKERS", 8)))
+# spodziewana łączna liczba otwartych ekranów z tablicą (połączeń SSE) i wątki na resztę ruchu
+SSE_CLIENTS = _env_int("GUNICORN_SSE_CLIENTS", 64)
+REQUEST_THREADS = _env_int("GUNICORN_REQUEST_THREADS", 8)
+# połączenia nie rozkładają się między workery idealnie równo - 25% zapasu na proces
+threads = _env_int("GUNICORN_THREADS", -(-SSE_CLIENTS * 5 // (4 * workers)) + REQUEST_THREADS)
+
+preload_app = True
+
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 2000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10)
+
+# timeout dotyczy zawieszonego workera, nie długości żądania (SSE działa dłużej)
+timeout = _env_int("GUNICORN_TIMEOUT", 60)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# heartbeat workerów w pamięci, a nie na (czasem wolnym) dysku kontenera
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = None            # log dostępu pisze aplikacja (logging_setup)
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+
+def post_fork(server, worker):
+    from db import dispose_after_fork
+    import logging_setup
+    dispose_after_fork()
+    logging_setup.restart_listener()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.retire(worker.pid)
+
+
+def on_starting(server):
+    import metrics
+    metrics.reset_dir()
+    server.log.info("gunicorn: %d workerów x %d wątków (gthread), ekrany SSE=%d, CPU=%d",
+                    workers, threads, SSE_CLIENTS, CPUS)
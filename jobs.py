@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Zadania w tle bez zewnętrznego brokera - kolejką jest tabela `jobs`.
+
+Widok zapisuje zadanie (enqueue) i od razu odsyła jego numer; strona
+/jobs/<id> odpytuje o status i postęp, a po zakończeniu przechodzi do
+wyniku. Zadania wykonuje osobny proces:
+
+    python jobs.py worker                 # pracuje w pętli
+    python jobs.py worker --workers 4     # rozmiar puli procesów
+    python jobs.py worker --once          # wykonaj kolejkę i zakończ
+    python jobs.py enqueue seed_test_data # zleć zadanie z konsoli
+
+Proces główny workera pobiera zadania z bazy (UPDATE ... WHERE
+status='queued' - dany wiersz dostanie tylko jeden worker) i przekazuje
+je do puli procesów, więc parsowanie plików nie blokuje ani serwera WWW,
+ani pobierania kolejnych zadań.
+
+Wyjątek w zadaniu = ponowienie z rosnącym odstępem (do max_attempts);
+JobFailed to błąd, którego ponowienie nie naprawi (np. zły format pliku).
+Zadania workera, który przestał się odzywać (heartbeat), wracają do kolejki.
+
+Handler to funkcja (ctx, **payload) -> wynik (JSON), rejestrowana
+dekoratorem @handler. Pliki z uploadu trafiają do JOBS_DIR (save_upload)
+i są usuwane, gdy zadanie się zakończy (done/failed), zostanie usunięte
+przez retencję albo nikt go nie uruchomi przez JOB_RETENTION_DAYS; pliki
+bez zadania (np. błąd przy zleceniu) sprząta prune() po JOB_STALE_SECONDS.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+# Dodaj ścieżkę do modułów aplikacji
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Blueprint, render_template, request, redirect, jsonify, url_for, abort
+from flask_login import login_required, current_user
+from sqlalchemy import select, update, delete
+from db import SessionLocal, engine, dispose_after_fork
+from models import Job
+import logging_setup
+import kpi_cache
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_RETRY_SECONDS = int(os.getenv("JOB_RETRY_SECONDS", "10"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+# tryb deweloperski bez workera: zadanie wykonuje się od razu w żądaniu
+JOBS_INLINE = os.getenv("JOBS_INLINE", "0") == "1"
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "logitrans-jobs"))
+HEARTBEAT_SECONDS = 15
+PROGRESS_INTERVAL = 1.0
+
+log = logging.getLogger("logitrans.jobs")
+
+Handler = namedtuple("Handler", "fn result_endpoint max_attempts")
+HANDLERS = {}
+
+
+class JobFailed(Exception):
+    """Błąd, którego ponowienie nie naprawi - zadanie od razu kończy się statusem failed"""
+
+
+def handler(kind, result_endpoint=None, max_attempts=3):
+    """Rejestruje funkcję (ctx, **payload) jako wykonawcę zadań danego rodzaju"""
+    def register(fn):
+        HANDLERS[kind] = Handler(fn, result_endpoint, max_attempts)
+        return fn
+    return register
+
+
+class JobContext:
+    """Przekazywany do handlera: numer zadania i raportowanie postępu"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last = 0.0
+
+    def progress(self, percent, message=None, force=False):
+        """Zapisuje postęp (nie częściej niż co PROGRESS_INTERVAL s, chyba że force)"""
+        now = time.monotonic()
+        if not force and now - self._last < PROGRESS_INTERVAL:
+            return
+        self._last = now
+        with SessionLocal() as db:
+            db.execute(update(Job).where(Job.id == self.job_id).values(
+                progress=max(0, min(100, int(percent))),
+                message=(message or "")[:200] or None,
+                heartbeat_at=datetime.utcnow(),
+            ))
+            db.commit()
+
+
+# ——— kolejka ———
+
+def save_upload(file):
+    """Kopiuje plik z uploadu do JOBS_DIR (strumieniowo); zwraca ścieżkę dla workera"""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    with tempfile.NamedTemporaryFile(dir=JOBS_DIR, suffix=suffix, delete=False) as out:
+        shutil.copyfileobj(file.stream, out, 1024 * 1024)
+    return out.name
+
+
+def enqueue(db, kind, payload=None, user_id=None, max_attempts=None):
+    """Dodaje zadanie do kolejki (commit robi wywołujący); zwraca Job"""
+    h = HANDLERS[kind]
+    job = Job(kind=kind, payload=json.dumps(payload or {}), created_by_id=user_id,
+              max_attempts=max_attempts or h.max_attempts, run_after=datetime.utcnow())
+    db.add(job)
+    db.flush()
+    return job
+
+
+def submit(kind, payload=None, user_id=None):
+    """enqueue + commit we własnej sesji; przy JOBS_INLINE od razu wykonuje; zwraca id"""
+    with SessionLocal() as db:
+        job_id = enqueue(db, kind, payload, user_id).id
+        db.commit()
+    if JOBS_INLINE:
+        with SessionLocal() as db:
+            claimed = _claim_one(db, job_id, "inline")
+        if claimed:
+            run_job(job_id)
+    return job_id
+
+
+def _claim_one(db, job_id, worker_id):
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(status="running", locked_by=worker_id, attempts=Job.attempts + 1,
+                started_at=now, heartbeat_at=now, error=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(claimed)
+
+
+def claim(db, worker_id, limit=1):
+    """Rezerwuje do `limit` zadań gotowych do uruchomienia; zwraca ich numery"""
+    candidates = db.scalars(
+        select(Job.id)
+        .where(Job.status == "queued", Job.run_after <= datetime.utcnow())
+        .order_by(Job.run_after, Job.id)
+        .limit(limit * 2)
+    ).all()
+    claimed = []
+    for job_id in candidates:
+        if len(claimed) >= limit:
+            break
+        # inny worker mógł wziąć to zadanie między SELECT a UPDATE
+        if _claim_one(db, job_id, worker_id):
+            claimed.append(job_id)
+    return claimed
+
+
+def heartbeat(db, job_ids):
+    if job_ids:
+        db.execute(update(Job).where(Job.id.in_(job_ids), Job.status == "running")
+                   .values(heartbeat_at=datetime.utcnow()).execution_options(synchronize_session=False))
+        db.commit()
+
+
+def requeue_stale(db, stale_seconds=JOB_STALE_SECONDS):
+    """Zadania, których worker zniknął, wracają do kolejki (albo kończą się, gdy brak prób)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    stale = db.scalars(select(Job.id).where(Job.status == "running", Job.heartbeat_at < cutoff)).all()
+    for job_id in stale:
+        record_failure(job_id, "worker przestał odpowiadać")
+    return len(stale)
+
+
+def prune(db, days=JOB_RETENTION_DAYS):
+    """Usuwa zakończone zadania starsze niż `days` dni, kończy nieuruchomione i sprząta pliki uploadu"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    # zadanie w kolejce od `days` dni (brak workera, nieznany rodzaj) - nikt go już nie wykona
+    for job in db.scalars(select(Job).where(Job.status == "queued", Job.created_at < cutoff)).all():
+        job.status, job.finished_at = "failed", now
+        job.error = f"nie uruchomione przez {days} dni"
+        _discard_upload(json.loads(job.payload or "{}"))
+    finished = (Job.status.in_(("done", "failed")), Job.finished_at < cutoff)
+    for payload in db.scalars(select(Job.payload).where(*finished)).all():
+        _discard_upload(json.loads(payload or "{}"))
+    n = db.execute(delete(Job).where(*finished)).rowcount
+    db.commit()
+    sweep_uploads(db)
+    return n
+
+
+def sweep_uploads(db, grace_seconds=JOB_STALE_SECONDS):
+    """Usuwa z JOBS_DIR pliki, których nie używa żadne czekające ani trwające zadanie.
+
+    Plik młodszy niż `grace_seconds` zostaje - widok mógł go zapisać i jeszcze
+    nie zlecić zadania.
+    """
+    try:
+        entries = list(os.scandir(JOBS_DIR))
+    except OSError:
+        return 0
+    active = {os.path.abspath(p) for p in (
+        json.loads(payload or "{}").get("path")
+        for payload in db.scalars(select(Job.payload).where(Job.status.in_(("queued", "running")))).all()
+    ) if p}
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for e in entries:
+        try:
+            if e.is_file() and e.path not in active and os.path.abspath(e.path) not in active \
+                    and e.stat().st_mtime < cutoff:
+                os.remove(e.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# ——— wykonanie ———
+
+def _discard_upload(payload):
+    path = payload.get("path")
+    if path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(JOBS_DIR):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def record_failure(job_id, error, permanent=False):
+    """Błąd zadania: ponowienie z odstępem JOB_RETRY_SECONDS * 2^(próba-1) albo status failed"""
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        if job is None:
+            return
+        now = datetime.utcnow()
+        if permanent or job.attempts >= job.max_attempts:
+            job.status, job.finished_at = "failed", now
+            _discard_upload(json.loads(job.payload or "{}"))
+        else:
+            job.status = "queued"
+            job.run_after = now + timedelta(seconds=JOB_RETRY_SECONDS * 2 ** max(0, job.attempts - 1))
+        job.error = error[:2000]
+        job.locked_by = None
+        db.commit()
+
+
+def run_job(job_id):
+    """Wykonuje zarezerwowane zadanie (w procesie puli) i zapisuje jego wynik"""
+    with SessionLocal() as db:
+        job = db.get(Job, job_id)
+        kind, payload = job.kind, json.loads(job.payload or "{}")
+    h = HANDLERS.get(kind)
+    try:
+        if h is None:
+            raise JobFailed(f"nieznany rodzaj zadania: {kind}")
+        result = h.fn(JobContext(job_id), **payload)
+    except JobFailed as e:
+        log.warning("zadanie %s #%s nie powiodło się: %s", kind, job_id, e)
+        record_failure(job_id, str(e), permanent=True)
+        return
+    except Exception as e:
+        log.exception("zadanie %s #%s przerwane wyjątkiem", kind, job_id)
+        record_failure(job_id, f"{e.__class__.__name__}: {e}")
+        return
+
+    with SessionLocal() as db:
+        db.execute(update(Job).where(Job.id == job_id).values(
+            status="done", progress=100, message=None, locked_by=None,
+            result=json.dumps(result, default=str), finished_at=datetime.utcnow(),
+        ))
+        db.commit()
+    _discard_upload(payload)
+    log.info("zadanie %s #%s zakończone", kind, job_id)
+
+
+def _init_process():
+    """Proces puli po fork(): własne połączenia z bazą i własny wątek logów"""
+    dispose_after_fork()
+    logging_setup.restart_listener()
+
+
+def work(workers=JOB_WORKERS, poll=JOB_POLL_SECONDS, once=False):
+    """Pętla workera: rezerwuje zadania i wykonuje je w puli `workers` procesów"""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    pool = ProcessPoolExecutor(workers, initializer=_init_process)
+    running = {}    # future -> job_id
+    last_beat = 0.0
+    log.info("worker %s: %d procesów", worker_id, workers)
+    try:
+        while True:
+            with SessionLocal() as db:
+                if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+                    heartbeat(db, list(running.values()))
+                    requeue_stale(db)
+                    prune(db)
+                    last_beat = time.monotonic()
+                free = workers - len(running)
+                claimed = claim(db, worker_id, free) if free > 0 else []
+            for job_id in claimed:
+                running[pool.submit(run_job, job_id)] = job_id
+            if once and not running and not claimed:
+                return
+
+            if running:
+                finished, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            else:
+                finished = ()
+                time.sleep(poll)
+
+            broken = False
+            for future in finished:
+                job_id = running.pop(future)
+                exc = future.exception()
+                if exc is not None:
+                    # proces puli zginął (np. brak pamięci) - run_job nie zdążył zapisać wyniku
+                    log.error("zadanie #%s: proces puli zakończył się błędem: %r", job_id, exc)
+                    record_failure(job_id, f"{exc.__class__.__name__}: {exc}")
+                    broken = broken or isinstance(exc, BrokenProcessPool)
+            if broken:
+                for job_id in running.values():
+                    record_failure(job_id, "przerwane - restart puli procesów")
+                running.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(workers, initializer=_init_process)
+    finally:
+        pool.shutdown(wait=True)
+
+
+# ——— zadania ———
+
+@handler("kpi_upload", result_endpoint="kpi.kpi_job_result", max_attempts=2)
+def kpi_upload_job(ctx, path, filename, key):
+    import kpi_ingest
+    ctx.progress(10, "liczenie KPI", force=True)
+    try:
+        with open(path, "rb") as f:
+            results, agg = kpi_ingest.aggregate_file(f, filename)
+    except kpi_ingest.KpiFormatError as e:
+        raise JobFailed(str(e))
+    kpi_cache.put(key, results)
+    return {"key": key, "rows": agg.rows, "skipped": agg.skipped}
+
+
+@handler("load_import", result_endpoint="loads.import_job_result")
+def load_import_job(ctx, path, filename, user_id, upsert=False):
+    import load_import
+    # import to jedna transakcja - po błędzie bazy można go bezpiecznie powtórzyć
+    with open(path, "rb") as f, SessionLocal() as db:
+        try:
+            report = load_import.import_file(db, f, filename, user_id, upsert,
+                                             progress=lambda pct, msg: ctx.progress(pct, msg, force=True))
+        except load_import.ImportFormatError as e:
+            raise JobFailed(str(e))
+        db.commit()
+    return report
+
+
+@handler("seed_test_data", max_attempts=1)
+def seed_test_data_job(ctx, user_id=None):
+    from add_test_data import create_test_data, TestDataError
+    with SessionLocal() as db:
+        try:
+            return create_test_data(db, user_id)
+        except TestDataError as e:
+            raise JobFailed(str(e))
+
+
+@handler("archive", max_attempts=1)
+def archive_job(ctx, **options):
+    from archive import run_archive
+    stats = run_archive(**options)
+    return {"batches": len(stats), "rows": sum(s["rows"] for s in stats)}
+
+
+# ——— widoki ———
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+def job_for_user(db, job_id):
+    """Zadanie widoczne dla zalogowanego (własne; ADMIN/SUPERVISOR - wszystkie) albo 404"""
+    job = db.get(Job, job_id)
+    if job is None:
+        abort(404)
+    if job.created_by_id != current_user.id and current_user.role.name not in ("ADMIN", "SUPERVISOR"):
+        abort(404)
+    return job
+
+
+def job_result(job):
+    return json.loads(job.result) if job.result else None
+
+
+def job_to_dict(job):
+    h = HANDLERS.get(job.kind)
+    done = job.status == "done"
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "result": job_result(job) if done else None,
+        "result_url": url_for(h.result_endpoint, job_id=job.id) if done and h and h.result_endpoint else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def accepted(job_id):
+    """Odpowiedź na zlecenie zadania: 202 + adres statusu dla API, przekierowanie dla przeglądarki"""
+    status_url = url_for("jobs.job_status", job_id=job_id)
+    if request.accept_mimetypes.best == "application/json":
+        response = jsonify({"job_id": job_id, "status_url": status_url})
+        response.status_code = 202
+        response.headers["Location"] = status_url
+        return response
+    return redirect(status_url)
+
+
+@jobs_bp.route("/jobs", methods=["GET"])
+@login_required
+def job_list():
+    """Ostatnie zadania zalogowanego (ADMIN/SUPERVISOR - wszystkich) jako JSON"""
+    with SessionLocal() as db:
+        q = select(Job).order_by(Job.id.desc()).limit(50)
+        if current_user.role.name not in ("ADMIN", "SUPERVISOR"):
+            q = q.where(Job.created_by_id == current_user.id)
+        return jsonify([job_to_dict(j) for j in db.scalars(q)])
+
+
+@jobs_bp.route("/jobs/<int:job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    """Status i postęp zadania: JSON (odpytywanie) albo strona, która odpytuje sama"""
+    with SessionLocal() as db:
+        data = job_to_dict(job_for_user(db, job_id))
+    if request.accept_mimetypes.best == "application/json" or request.args.get("format") == "json":
+        response = jsonify(data)
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    return render_template("job.html", job=data)
+
+
+# ——— CLI ———
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Zadania w tle (kolejka w bazie)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    w = sub.add_parser("worker", help="wykonuj zadania z kolejki")
+    w.add_argument("--workers", type=int, default=JOB_WORKERS, help="rozmiar puli procesów")
+    w.add_argument("--once", action="store_true", help="wykonaj gotowe zadania i zakończ")
+    e = sub.add_parser("enqueue", help="dodaj zadanie do kolejki")
+    e.add_argument("kind", choices=sorted(HANDLERS))
+    e.add_argument("--payload", default="{}", help="parametry jako JSON")
+    args = parser.parse_args(argv)
+
+    from migrations import run_migrations
+    logging_setup.configure_logging()
+    run_migrations(engine)
+    if args.command == "worker":
+        work(args.workers, once=args.once)
+    else:
+        print(submit(args.kind, json.loads(args.payload)))
+
+
+if __name__ == "__main__":
+    main()
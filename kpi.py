@@ -1,14 +1,23 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from flask_login import login_required
-import pandas as pd
-from io import BytesIO
+from flask_login import login_required, current_user
+from db import SessionLocal
+from models import parse_ship_date
+import kpi_rollup
+import kpi_cache
+from kpi_formats import detect_format, KpiFormatError
+import jobs
 
 kpi_bp = Blueprint("kpi", __name__)
 
 @kpi_bp.route("/kpi", methods=["GET"])
 @login_required
 def kpi_view():
-    return render_template("kpi.html", results=None)
+    day_from, day_to = kpi_rollup.date_range(request.args.get("from"), request.args.get("to"), parse_ship_date)
+    with SessionLocal() as db:
+        kpi_rollup.refresh(db)
+        report = kpi_rollup.report(db, day_from, day_to)
+    return render_template("kpi.html", results=None, report=report,
+                           day_from=day_from.isoformat(), day_to=day_to.isoformat())
 
 @kpi_bp.route("/kpi", methods=["POST"])
 @login_required
@@ -17,17 +26,30 @@ def kpi_upload():
     if not file:
         flash("Dodaj plik Excel", "error")
         return redirect(url_for("kpi.kpi_view"))
-    data = file.read()
-    df = pd.read_excel(BytesIO(data))
-    df.columns = [c.strip().lower() for c in df.columns]
-    required = {"timestamp", "user_email", "shift", "loads_count"}
-    if not required.issubset(set(df.columns)):
-        flash(f"Brak wymaganych kolumn: {required}", "error")
+    # plik czytany strumieniowo z pliku tymczasowego uploadu (bez file.read())
+    try:
+        fmt = detect_format(file.filename)
+    except KpiFormatError as e:
+        flash(str(e), "error")
         return redirect(url_for("kpi.kpi_view"))
-    df["shift"] = df["shift"].astype(str).str.upper().map({"A":"A","B":"B","C":"C"})
-    df = df.dropna(subset=["user_email","shift"])
-    by_shift = df.groupby("shift").agg(total_loads=("loads_count","sum")).reset_index()
-    by_user = df.groupby("user_email").agg(total_loads=("loads_count","sum")).reset_index().sort_values("total_loads", ascending=False)
-    res = {"by_shift": by_shift.to_dict(orient="records"),
-           "by_user": by_user.to_dict(orient="records")}
-    return render_template("kpi.html", results=res)
+    key = kpi_cache.content_key(file.stream, fmt)
+    res = kpi_cache.get(key)
+    if res is not None:
+        return render_template("kpi.html", results=res, from_cache=True, cache_stats=kpi_cache.stats())
+    # parsowanie dużego pliku robi worker zadań - żądanie kończy się od razu
+    job_id = jobs.submit("kpi_upload", {"path": jobs.save_upload(file), "filename": file.filename, "key": key},
+                         current_user.id)
+    return jobs.accepted(job_id)
+
+@kpi_bp.route("/kpi/jobs/<int:job_id>", methods=["GET"])
+@login_required
+def kpi_job_result(job_id):
+    """Wynik zadania kpi_upload (z cache KPI, do którego zapisał go worker)"""
+    with SessionLocal() as db:
+        result = jobs.job_result(jobs.job_for_user(db, job_id))
+    # chybienie zostało policzone przy wysłaniu pliku - odczyt wyniku zadania nie jest trafieniem
+    res = kpi_cache.peek(result["key"]) if result else None
+    if res is None:
+        flash("Wynik KPI wygasł albo zadanie jeszcze się nie zakończyło - wczytaj plik ponownie", "error")
+        return redirect(url_for("kpi.kpi_view"))
+    return render_template("kpi.html", results=res, from_cache=False, cache_stats=kpi_cache.stats())
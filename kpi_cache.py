@@ -0,0 +1,101 @@
+# kpi_cache.py
+"""
+Cache wyników KPI z wczytanych plików, adresowany treścią.
+
+Klucz to sha256 z bajtów pliku i parametrów agregacji, więc ten sam eksport
+wczytany ponownie (albo przez innego kierownika, w innym workerze) nie jest
+parsowany drugi raz. Wyniki leżą jako pliki JSON w KPI_CACHE_DIR; gdy
+katalog przekroczy KPI_CACHE_MAX_BYTES, usuwane są najdawniej używane wpisy
+(czas modyfikacji pliku odświeżamy przy każdym trafieniu).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import metrics
+
+KPI_CACHE_DIR = os.getenv("KPI_CACHE_DIR", os.path.join(tempfile.gettempdir(), "logitrans-kpi-cache"))
+KPI_CACHE_MAX_BYTES = int(os.getenv("KPI_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# zmiana sposobu liczenia (kolumny, agregacja) = nowa wersja, stare wpisy przestają pasować
+AGG_VERSION = "kpi-v1"
+READ_CHUNK = 1024 * 1024
+
+_lock = threading.Lock()
+_stats = {"hit": 0, "miss": 0}
+
+
+def content_key(stream, *params):
+    """sha256(parametry + bajty pliku); czyta strumień porcjami i przewija go na początek"""
+    h = hashlib.sha256("|".join((AGG_VERSION,) + tuple(str(p) for p in params)).encode("utf-8"))
+    h.update(b"\0")
+    for chunk in iter(lambda: stream.read(READ_CHUNK), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+def _path(key):
+    return os.path.join(KPI_CACHE_DIR, f"{key}.json")
+
+
+def _count(result):
+    with _lock:
+        _stats[result] += 1
+    metrics.inc("kpi_cache_requests_total", {"result": result})
+
+
+def peek(key):
+    """Zapisany wynik albo None - bez liczenia w statystykach trafień"""
+    path = _path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            value = json.load(f)
+        os.utime(path)   # LRU: ostatnie użycie
+    except (OSError, ValueError):
+        return None
+    return value
+
+
+def get(key):
+    """Zapisany wynik albo None; liczy trafienie/chybienie (kpi_cache_requests_total)"""
+    value = peek(key)
+    _count("miss" if value is None else "hit")
+    return value
+
+
+def put(key, value):
+    os.makedirs(KPI_CACHE_DIR, exist_ok=True)
+    tmp = _path(key) + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(value, f, ensure_ascii=False)
+    os.replace(tmp, _path(key))
+    evict()
+
+
+def evict(max_bytes=KPI_CACHE_MAX_BYTES):
+    """Usuwa najdawniej używane wpisy, aż katalog zmieści się w limicie"""
+    entries = []
+    try:
+        with os.scandir(KPI_CACHE_DIR) as it:
+            for e in it:
+                if e.name.endswith(".json"):
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def stats():
+    """Liczniki trafień/chybień w tym procesie"""
+    with _lock:
+        return dict(_stats)
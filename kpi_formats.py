@@ -0,0 +1,23 @@
+# kpi_formats.py
+"""
+Formaty plików KPI rozpoznawane po rozszerzeniu - bez pandas/openpyxl.
+
+Widok uploadu (kpi.py) sprawdza tu format i liczy klucz cache, a samo
+wczytanie pliku (kpi_ingest, z pandas i openpyxl) odbywa się w workerze
+zadań - proces WWW nie ładuje ciężkich bibliotek.
+"""
+import os
+
+FORMATS = {".xlsx": "xlsx", ".xlsm": "xlsx", ".csv": "csv", ".txt": "csv", ".parquet": "parquet"}
+
+
+class KpiFormatError(ValueError):
+    """Plik nie nadaje się do policzenia KPI (brak kolumn, zły format)"""
+
+
+def detect_format(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    fmt = FORMATS.get(ext)
+    if fmt is None:
+        raise KpiFormatError("Obsługiwane formaty: xlsx, csv, parquet")
+    return fmt
@@ -0,0 +1,170 @@
+# kpi_ingest.py
+"""
+Strumieniowe wczytywanie eksportów KPI (xlsx / csv / parquet).
+
+Plik nie jest wczytywany w całości do pamięci: xlsx czytamy wiersz po
+wierszu (openpyxl read_only), CSV w porcjach (pandas chunksize), Parquet
+partiami (pyarrow iter_batches). Każda porcja od razu trafia do agregatora,
+który trzyma tylko sumy per zmiana i per użytkownik - zużycie pamięci nie
+zależy od liczby wierszy.
+
+Wynik ma ten sam kształt co dotychczas w kpi.py:
+    {"by_shift": [{"shift", "total_loads"}], "by_user": [{"user_email", "total_loads"}]}
+"""
+import csv
+import io
+import math
+import os
+import zipfile
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from kpi_formats import FORMATS, KpiFormatError, detect_format
+
+REQUIRED = {"timestamp", "user_email", "shift", "loads_count"}
+SHIFTS = {"A", "B", "C"}
+CSV_CHUNK_ROWS = int(os.getenv("KPI_CSV_CHUNK_ROWS", "50000"))
+PARQUET_BATCH_ROWS = int(os.getenv("KPI_PARQUET_BATCH_ROWS", "65536"))
+
+def _norm(name):
+    return str(name).strip().lower() if name is not None else ""
+
+
+def _missing_columns(columns):
+    if not REQUIRED.issubset({_norm(c) for c in columns}):
+        raise KpiFormatError(f"Brak wymaganych kolumn: {REQUIRED}")
+
+
+def _number(v):
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return None if isinstance(v, float) and math.isnan(v) else v
+    try:
+        return float(str(v).replace(",", ".").strip())
+    except ValueError:
+        return None
+
+
+def _clean(total):
+    total = float(total)
+    return int(total) if total.is_integer() else total
+
+
+class KpiAggregator:
+    """Sumy załadunków per zmiana i per użytkownik, liczone przyrostowo"""
+
+    def __init__(self):
+        self.by_shift = {}
+        self.by_user = {}
+        self.rows = 0
+        self.skipped = 0
+
+    def add(self, user_email, shift, loads_count):
+        self.rows += 1
+        shift = str(shift).strip().upper() if shift is not None else None
+        if user_email is None or (isinstance(user_email, float) and math.isnan(user_email)) or shift not in SHIFTS:
+            self.skipped += 1
+            return
+        n = _number(loads_count) or 0
+        self.by_shift[shift] = self.by_shift.get(shift, 0) + n
+        self.by_user[user_email] = self.by_user.get(user_email, 0) + n
+
+    def add_frame(self, df):
+        """Porcja jako DataFrame (kolumny już znormalizowane) - agregacja wektorowa"""
+        self.rows += len(df)
+        shift = df["shift"].astype(str).str.strip().str.upper()
+        ok = shift.isin(SHIFTS) & df["user_email"].notna()
+        self.skipped += int((~ok).sum())
+        part = pd.DataFrame({
+            "shift": shift[ok],
+            "user_email": df["user_email"][ok],
+            "loads_count": pd.to_numeric(df["loads_count"][ok], errors="coerce").fillna(0),
+        })
+        for k, v in part.groupby("shift")["loads_count"].sum().items():
+            self.by_shift[k] = self.by_shift.get(k, 0) + v
+        for k, v in part.groupby("user_email")["loads_count"].sum().items():
+            self.by_user[k] = self.by_user.get(k, 0) + v
+
+    def results(self):
+        by_user = sorted(self.by_user.items(), key=lambda kv: kv[1], reverse=True)
+        return {
+            "by_shift": [{"shift": k, "total_loads": _clean(v)} for k, v in sorted(self.by_shift.items())],
+            "by_user": [{"user_email": k, "total_loads": _clean(v)} for k, v in by_user],
+        }
+
+
+# ——— czytniki ———
+
+def ingest_xlsx(stream, agg):
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        _missing_columns(header)
+        idx = {_norm(c): i for i, c in enumerate(header)}
+        iu, ish, ic = idx["user_email"], idx["shift"], idx["loads_count"]
+        for row in rows:
+            if not row or all(v is None for v in row):
+                continue
+            get = lambda i: row[i] if i < len(row) else None
+            agg.add(get(iu), get(ish), get(ic))
+    finally:
+        wb.close()
+
+
+def _sniff_separator(text_stream):
+    sample = text_stream.read(4096)
+    text_stream.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def ingest_csv(stream, agg, chunk_rows=CSV_CHUNK_ROWS):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        sep = _sniff_separator(text)
+        usecols = lambda c: _norm(c) in REQUIRED
+        header = pd.read_csv(text, sep=sep, nrows=0).columns
+        _missing_columns(header)
+        text.seek(0)
+        for chunk in pd.read_csv(text, sep=sep, usecols=usecols, chunksize=chunk_rows):
+            chunk.columns = [_norm(c) for c in chunk.columns]
+            agg.add_frame(chunk)
+    finally:
+        text.detach()
+
+
+def ingest_parquet(stream, agg, batch_rows=PARQUET_BATCH_ROWS):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise KpiFormatError("Obsługa plików Parquet wymaga pakietu pyarrow")
+    try:
+        pf = pq.ParquetFile(stream)
+    except (pa.ArrowInvalid, OSError) as e:
+        raise KpiFormatError(f"Nie można odczytać pliku: {e}")
+    names = {_norm(c): c for c in pf.schema_arrow.names}
+    _missing_columns(names)
+    columns = [names[c] for c in ("user_email", "shift", "loads_count")]
+    for batch in pf.iter_batches(batch_size=batch_rows, columns=columns):
+        df = batch.to_pandas()
+        df.columns = [_norm(c) for c in df.columns]
+        agg.add_frame(df)
+
+
+READERS = {"xlsx": ingest_xlsx, "csv": ingest_csv, "parquet": ingest_parquet}
+
+
+def aggregate_file(stream, filename):
+    """Liczy KPI z pliku (obiekt plikowy z możliwością seek); zwraca (wyniki, agregator)"""
+    agg = KpiAggregator()
+    reader = READERS[detect_format(filename)]
+    try:
+        reader(stream, agg)
+    except (zipfile.BadZipFile, InvalidFileException, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise KpiFormatError(f"Nie można odczytać pliku: {e}")
+    return agg.results(), agg
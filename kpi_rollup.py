@@ -0,0 +1,171 @@
+# kpi_rollup.py
+"""
+KPI liczone z tablicy (`loads` + `loads_archive`) przez tabelę `kpi_rollup`.
+
+Rollup trzyma sumy (liczba rekordów, planned, done) per dzień, zmiana,
+kompletujący, pas i godzina slotu. Strona KPI czyta tylko z niego.
+
+Odświeżanie jest przyrostowe i liczy całe dni od nowa: po wersji tablicy
+(`board_state.kpi_revision`) zbieramy dni zmienionych rekordów (Load.revision),
+usuniętych/zarchiwizowanych (tombstone) i przeniesionych na inny dzień
+(`kpi_dirty_days`). Pełna przebudowa jest potrzebna tylko przy pierwszym
+uruchomieniu, gdy rollup jest pusty mimo danych (baza po migracji ma
+rekordy, a wersja tablicy wciąż wynosi 0) albo gdy retencja usunęła
+tombstone'y, których jeszcze nie uwzględniliśmy.
+
+Przyrost jest rezerwowany w osobnej, krótkiej transakcji (UPDATE wiersza
+board_state), a przeliczenie idzie w kolejnych - po DAYS_PER_BATCH dni na
+commit. Dzięki temu przebudowa nie trzyma blokady board_state, o którą
+walczy każdy zapis tablicy (bump_version), a na SQLite blokada zapisu bazy
+jest zwalniana po każdej paczce dni. Gdy przeliczenie się nie uda,
+kpi_revision wraca do poprzedniej wartości i następne wywołanie zaczyna od nowa.
+"""
+from datetime import timedelta
+from sqlalchemy import select, delete, insert, update, func, cast, extract, literal_column, Integer, String
+from models import Load, LoadArchive, LoadTombstone, KpiRollup, KpiDirtyDay, BoardState, operational_day
+from archive import loads_with_archive
+import board_cache
+
+DAYS_PER_BATCH = 200
+DEFAULT_RANGE_DAYS = 7
+
+ROLLUP_COLUMNS = ["ship_day", "shift", "picker", "lane", "hour", "loads", "planned", "done"]
+
+
+def _rollup_select(days=None):
+    """SELECT ... GROUP BY zasilający kpi_rollup (stałe wstawione w SQL, bo
+    PostgreSQL nie dopasuje GROUP BY do wyrażeń z różnymi parametrami)"""
+    src = loads_with_archive()
+    empty, none = literal_column("''"), literal_column("-1")
+    key = [
+        src.c.ship_day,
+        func.coalesce(cast(src.c.shift, String), empty),
+        func.coalesce(src.c.picker, empty),
+        func.coalesce(src.c.lane, empty),
+        func.coalesce(cast(extract("hour", src.c.slot_time), Integer), none),
+    ]
+    q = select(
+        *key,
+        func.count(),
+        func.coalesce(func.sum(src.c.planned), literal_column("0")),
+        func.coalesce(func.sum(src.c.done), literal_column("0")),
+    ).where(src.c.ship_day.is_not(None)).group_by(*key)
+    if days is not None:
+        q = q.where(src.c.ship_day.in_(days))
+    return q
+
+
+def _rebuild(db, days):
+    """Przelicza podane dni; commit po każdej paczce DAYS_PER_BATCH dni"""
+    days = sorted(days)
+    for i in range(0, len(days), DAYS_PER_BATCH):
+        part = days[i:i + DAYS_PER_BATCH]
+        db.execute(delete(KpiRollup).where(KpiRollup.ship_day.in_(part)))
+        db.execute(insert(KpiRollup).from_select(ROLLUP_COLUMNS, _rollup_select(part)))
+        db.commit()
+
+
+def _all_days(db):
+    """Pełna przebudowa = przeliczenie każdego dnia z danymi i tych, które zostały tylko w rollupie"""
+    src = loads_with_archive()
+    days = set(db.scalars(select(src.c.ship_day).where(src.c.ship_day.is_not(None)).distinct()))
+    return days | set(db.scalars(select(KpiRollup.ship_day).distinct()))
+
+
+def _rollup_missing(db):
+    """Pusty rollup przy istniejących rekordach - np. baza zmigrowana z danymi, ale bez zapisów"""
+    if db.scalar(select(KpiRollup.ship_day).limit(1)) is not None:
+        return False
+    return any(db.scalar(select(model.id).where(model.ship_day.is_not(None)).limit(1)) is not None
+               for model in (Load, LoadArchive))
+
+
+def refresh(db, full=False):
+    """Doprowadza kpi_rollup do bieżącej wersji tablicy; zwraca liczbę przeliczonych dni
+    (-1 = pełna przebudowa, 0 = nic do zrobienia)"""
+    state = db.get(BoardState, board_cache.BOARD_STATE_ID)
+    if state is None:
+        return 0
+    version, last = state.version, state.kpi_revision or 0
+    if not full and last == version:
+        if not _rollup_missing(db):
+            return 0
+        full = True
+    full = full or last == 0 or last > version or last < (state.pruned_revision or 0)
+
+    # "blokada optymistyczna": tylko jeden worker przelicza dany przyrost;
+    # commit od razu, żeby nie trzymać wiersza board_state przez przeliczenie
+    claimed = _set_revision(db, last, version)
+    if not claimed:
+        return 0
+
+    try:
+        max_dirty = db.scalar(select(func.max(KpiDirtyDay.id))) or 0
+        if full:
+            _rebuild(db, _all_days(db))
+            count = -1
+        else:
+            days = set(db.scalars(select(Load.ship_day).where(Load.revision > last).distinct()))
+            days |= set(db.scalars(select(LoadTombstone.ship_day).where(LoadTombstone.revision > last).distinct()))
+            days |= set(db.scalars(select(KpiDirtyDay.ship_day).where(KpiDirtyDay.id <= max_dirty).distinct()))
+            days.discard(None)
+            _rebuild(db, days)
+            count = len(days)
+        db.execute(delete(KpiDirtyDay).where(KpiDirtyDay.id <= max_dirty))
+        db.commit()
+    except Exception:
+        db.rollback()
+        # przyrost nie został policzony - oddajemy go następnemu wywołaniu
+        _set_revision(db, version, last)
+        raise
+    return count
+
+
+def _set_revision(db, expected, value):
+    """kpi_revision: expected -> value we własnej transakcji; True, gdy się udało"""
+    changed = db.execute(
+        update(BoardState)
+        .where(BoardState.id == board_cache.BOARD_STATE_ID, func.coalesce(BoardState.kpi_revision, 0) == expected)
+        .values(kpi_revision=value)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(changed)
+
+
+def date_range(raw_from, raw_to, parse):
+    """Zakres dat z formularza; domyślnie ostatnie DEFAULT_RANGE_DAYS dni operacyjnych"""
+    day_to = parse(raw_to) or operational_day()
+    day_from = parse(raw_from) or day_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if day_from > day_to:
+        day_from, day_to = day_to, day_from
+    return day_from, day_to
+
+
+def _group(db, where, *cols, order=None):
+    q = select(
+        *cols,
+        func.sum(KpiRollup.loads).label("loads"),
+        func.sum(KpiRollup.planned).label("planned"),
+        func.sum(KpiRollup.done).label("done"),
+    ).where(*where).group_by(*cols)
+    q = q.order_by(*(order if order is not None else cols))
+    rows = []
+    for r in db.execute(q):
+        d = r._asdict()
+        d["pct"] = round(100.0 * d["done"] / d["planned"], 1) if d["planned"] else None
+        rows.append(d)
+    return rows
+
+
+def report(db, day_from, day_to):
+    """KPI z rollupu dla zakresu dni: per zmiana, kompletujący x zmiana, pas, godzina"""
+    where = [KpiRollup.ship_day >= day_from, KpiRollup.ship_day <= day_to]
+    return {
+        "totals": (_group(db, where) or [None])[0],
+        "by_shift": _group(db, where, KpiRollup.shift),
+        "by_picker": _group(db, where + [KpiRollup.picker != ""], KpiRollup.picker, KpiRollup.shift,
+                            order=[func.sum(KpiRollup.done).desc(), KpiRollup.picker]),
+        "by_lane": _group(db, where, KpiRollup.lane),
+        "by_hour": _group(db, where, KpiRollup.hour),
+    }
@@ -0,0 +1,93 @@
+# load_export.py
+"""
+Eksport tablicy (`loads` + `loads_archive`) do CSV / XLSX.
+
+Wiersze są czytane kursorem po stronie serwera (yield_per) i od razu
+zapisywane do odpowiedzi, więc zużycie pamięci nie zależy od zakresu dat
+i nigdy nie ładujemy wszystkich obiektów Load naraz. Czytamy kolumny
+(Core), bez tworzenia obiektów ORM.
+
+CSV idzie do klienta porcjami w trakcie czytania. XLSX to archiwum zip,
+którego nie da się wysłać przed zapisaniem całości - budujemy go
+skoroszytem write-only (wiersze lądują w pliku tymczasowym, nie w pamięci)
+i dopiero gotowy plik wysyłamy porcjami.
+
+Kolumny odpowiadają importowi (load_import), więc wyeksportowany plik
+można wczytać z powrotem.
+"""
+import csv
+import io
+import os
+import tempfile
+from sqlalchemy import select
+from openpyxl import Workbook
+from archive import loads_with_archive
+
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+EXPORT_MAX_DAYS = int(os.getenv("EXPORT_MAX_DAYS", "366"))
+CSV_FLUSH_ROWS = 500
+SEND_CHUNK = 64 * 1024
+
+COLUMNS = ["ship_date", "shift", "time_slot", "lane", "seq", "area", "planned", "done",
+           "lo_code", "picker", "status", "trailer_no"]
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export_query(day_from, day_to):
+    """Rekordy z zakresu dni w kolejności tablicy"""
+    src = loads_with_archive()
+    return (
+        select(src.c.ship_day, *[src.c[c] for c in COLUMNS[1:]])
+        .where(src.c.ship_day >= day_from, src.c.ship_day <= day_to)
+        .order_by(src.c.ship_day, src.c.time_slot, src.c.lane, src.c.seq)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+
+
+def _rows(db, day_from, day_to):
+    for r in db.execute(export_query(day_from, day_to)):
+        day, shift = r[0], r[1]
+        yield (day.strftime("%d.%m.%Y") if day else "", shift.name if shift else "") + tuple(r[2:])
+
+
+def stream_csv(db, day_from, day_to):
+    """Generator kawałków CSV (separator ';' i BOM - Excel otwiera bez kreatora)"""
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";", lineterminator="\r\n")
+    buf.write("\ufeff")
+    writer.writerow(COLUMNS)
+    for n, row in enumerate(_rows(db, day_from, day_to), 1):
+        writer.writerow(["" if v is None else v for v in row])
+        if n % CSV_FLUSH_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def stream_xlsx(db, day_from, day_to):
+    """Generator kawałków gotowego pliku XLSX (skoroszyt write-only w pliku tymczasowym)"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Tablica")
+    ws.append(COLUMNS)
+    for row in _rows(db, day_from, day_to):
+        ws.append(row)
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        for chunk in iter(lambda: tmp.read(SEND_CHUNK), b""):
+            yield chunk
+
+
+WRITERS = {"csv": stream_csv, "xlsx": stream_xlsx}
+
+
+def generate(db, fmt, day_from, day_to):
+    """Strumień odpowiedzi; zamyka sesję po ostatnim kawałku albo po zerwaniu połączenia"""
+    try:
+        yield from WRITERS[fmt](db, day_from, day_to)
+    finally:
+        db.close()
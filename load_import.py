@@ -0,0 +1,215 @@
+# load_import.py
+"""
+Import planu ładunków z pliku (xlsx / csv).
+
+Walidacja i normalizacja są wektorowe (pandas): pas wielkimi literami,
+seq/planned/done jako liczby całkowite, zmiana A/B/C, godzina slotu HH:MM.
+Poprawne wiersze są wstawiane zbiorczo (executemany) w partiach, w jednej
+transakcji z jednym podbiciem wersji tablicy; błędne trafiają do raportu
+z numerem wiersza w pliku.
+
+Tryb upsert aktualizuje istniejące rekordy o tym samym kluczu
+(ship_day, time_slot, lane, seq). Dzień jest częścią klucza, bo tablica
+każdego dnia ma te same sloty, pasy i numery - bez niego plan na jutro
+nadpisałby dzisiejszy.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import select, insert, update, tuple_
+from models import Load, Shift, parse_ship_date, parse_time_slot, operational_day
+import board_cache
+import events
+
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "2000"))
+MAX_REPORTED_ERRORS = 500
+
+REQUIRED = ["time_slot", "lane"]
+TEXT_FIELDS = ["area", "lo_code", "picker", "status", "trailer_no", "ship_date"]
+INT_FIELDS = ["seq", "planned", "done"]
+SHIFTS = {s.name for s in Shift}
+KEY = ("ship_day", "time_slot", "lane", "seq")
+
+
+class ImportFormatError(ValueError):
+    """Pliku nie da się wczytać (format, brak kolumn)"""
+
+
+def read_frame(stream, filename):
+    """Cały plik jako DataFrame z tekstowymi kolumnami (bez zgadywania typów)"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    try:
+        if ext in (".xlsx", ".xlsm"):
+            df = pd.read_excel(stream, dtype=object, engine="openpyxl")
+        elif ext in (".csv", ".txt"):
+            text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+            sample = text.read(4096)
+            text.seek(0)
+            try:
+                sep = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+            except csv.Error:
+                sep = ","
+            df = pd.read_csv(text, sep=sep, dtype=str, keep_default_na=False)
+            text.detach()
+        else:
+            raise ImportFormatError("Obsługiwane formaty: xlsx, csv")
+    except (ValueError, OSError) as e:
+        if isinstance(e, ImportFormatError):
+            raise
+        raise ImportFormatError(f"Nie można odczytać pliku: {e}")
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    missing = [c for c in REQUIRED if c not in df.columns]
+    if missing:
+        raise ImportFormatError(f"Brak wymaganych kolumn: {', '.join(missing)}")
+    return df
+
+
+def _text(series):
+    """Kolumna jako oczyszczony tekst; puste -> "" (daty z Excela jako dd.mm.rrrr)"""
+    def conv(v):
+        if v is None or (isinstance(v, float) and pd.isna(v)):
+            return ""
+        if isinstance(v, datetime):
+            return v.strftime("%d.%m.%Y")
+        if isinstance(v, float) and v.is_integer():
+            return str(int(v))
+        return str(v).strip()
+    return series.map(conv)
+
+
+def validate(df):
+    """Normalizuje ramkę; zwraca (poprawne wiersze jako DataFrame, lista błędów)"""
+    n = len(df)
+    out = pd.DataFrame(index=df.index)
+    errors = pd.Series([[] for _ in range(n)], index=df.index, dtype=object)
+
+    def fail(mask, message):
+        for i in df.index[mask]:
+            errors[i].append(message)
+
+    # godzina slotu -> HH:MM
+    ts = _text(df["time_slot"])
+    parts = ts.str.extract(r"^(\d{1,2})[:.](\d{2})(?::\d{2})?$")
+    hh, mm = pd.to_numeric(parts[0], errors="coerce"), pd.to_numeric(parts[1], errors="coerce")
+    bad_ts = hh.isna() | mm.isna() | (hh > 23) | (mm > 59)
+    fail(bad_ts, "niepoprawna godzina slotu (oczekiwane HH:MM)")
+    out["time_slot"] = hh.fillna(0).astype(int).map("{:02d}".format) + ":" + mm.fillna(0).astype(int).map("{:02d}".format)
+
+    lane = _text(df["lane"]).str.upper()
+    fail(lane == "", "brak pasa")
+    fail(lane.str.len() > 10, "pas dłuższy niż 10 znaków")
+    out["lane"] = lane
+
+    for f in INT_FIELDS:
+        if f not in df.columns:
+            out[f] = None
+            continue
+        raw = _text(df[f])
+        num = pd.to_numeric(raw.str.replace(",", ".", regex=False), errors="coerce")
+        fail((raw != "") & num.isna(), f"{f}: to nie jest liczba")
+        bad = num.notna() & ((num % 1 != 0) | (num < 0))
+        fail(bad, f"{f}: oczekiwana liczba całkowita >= 0")
+        num = num.where(~bad)
+        out[f] = pd.Series([None if pd.isna(v) else int(v) for v in num], index=df.index, dtype=object)
+
+    for f in TEXT_FIELDS:
+        out[f] = _text(df[f]) if f in df.columns else ""
+    out["status"] = out["status"].str.upper()
+
+    if "shift" in df.columns:
+        shift = _text(df["shift"]).str.upper()
+        fail((shift != "") & ~shift.isin(SHIFTS), "zmiana musi być A, B lub C")
+        out["shift"] = shift.where(shift != "", Shift.A.name)
+    else:
+        out["shift"] = Shift.A.name
+
+    # typowane kolumny liczymy tu, bo wstawianie zbiorcze pomija zdarzenia ORM;
+    # parsujemy tylko unikalne wartości (w planie jest zwykle kilka dat)
+    today = operational_day()
+    days = {v: parse_ship_date(v) for v in out["ship_date"].unique()}
+    fail((out["ship_date"] != "") & out["ship_date"].map(lambda v: days[v] is None), "niepoprawna data wysyłki")
+    out["ship_day"] = out["ship_date"].map(lambda v: days[v] or today)
+    slots = {v: parse_time_slot(v) for v in out["time_slot"].unique()}
+    out["slot_time"] = out["time_slot"].map(slots)
+
+    ok = errors.map(len) == 0
+    report = [{"row": int(i) + 2, "errors": errors[i]} for i in df.index[~ok]]
+    return out[ok], report
+
+
+def import_loads(db, df, user_id, upsert=False):
+    """Zapisuje poprawne wiersze; zwraca (wstawione, zaktualizowane, błędy duplikatów)"""
+    rows = df.to_dict("records")
+    dup_errors = []
+    if upsert:
+        # w pliku ten sam klucz kilka razy - obowiązuje ostatni wiersz
+        last = {}
+        for pos, r in enumerate(rows):
+            if r["seq"] is not None:
+                k = tuple(r[c] for c in KEY)
+                if k in last:
+                    dup_errors.append({"row": int(df.index[last[k]]) + 2,
+                                       "errors": ["duplikat klucza w pliku - użyto późniejszego wiersza"]})
+                last[k] = pos
+        keep = set(last.values())
+        rows = [r for pos, r in enumerate(rows) if r["seq"] is None or pos in keep]
+
+    version = board_cache.bump_version(db)
+    now = datetime.utcnow()
+    for r in rows:
+        r.update(shift=Shift[r["shift"]], revision=version, updated_at=now, created_by_id=user_id)
+
+    to_update = []
+    if upsert:
+        keyed = [r for r in rows if r["seq"] is not None]
+        existing = {}
+        day_list = sorted({r["ship_day"] for r in keyed})
+        for i in range(0, len(day_list), 500):
+            q = select(Load.id, Load.ship_day, Load.time_slot, Load.lane, Load.seq).where(
+                Load.ship_day.in_(day_list[i:i + 500]),
+                tuple_(Load.time_slot, Load.lane).in_({(r["time_slot"], r["lane"]) for r in keyed}),
+            )
+            for row in db.execute(q):
+                existing[(row.ship_day, row.time_slot, row.lane, row.seq)] = row.id
+        to_insert = []
+        for r in rows:
+            load_id = existing.get(tuple(r[c] for c in KEY)) if r["seq"] is not None else None
+            if load_id is None:
+                to_insert.append(r)
+            else:
+                to_update.append({**{k: v for k, v in r.items() if k != "created_by_id"}, "id": load_id})
+    else:
+        to_insert = rows
+
+    for i in range(0, len(to_insert), IMPORT_BATCH):
+        db.execute(insert(Load.__table__), to_insert[i:i + IMPORT_BATCH])
+    for i in range(0, len(to_update), IMPORT_BATCH):
+        db.execute(update(Load), to_update[i:i + IMPORT_BATCH])
+
+    # ekrany przeładowują tablicę jednym zdarzeniem zamiast tysięcy pojedynczych
+    events.record(db, version, "reset")
+    return len(to_insert), len(to_update), dup_errors
+
+
+def import_file(db, stream, filename, user_id, upsert=False, progress=None):
+    """Cały import: wczytanie, walidacja, zapis (commit robi wywołujący); zwraca raport.
+
+    progress(procent, komunikat) - opcjonalnie, np. JobContext.progress z jobs.py
+    """
+    progress = progress or (lambda *a, **kw: None)
+    progress(5, "wczytywanie pliku")
+    df = read_frame(stream, filename)
+    progress(20, f"walidacja {len(df)} wierszy")
+    valid, errors = validate(df)
+    inserted = updated = 0
+    if len(valid):
+        progress(40, f"zapis {len(valid)} wierszy")
+        inserted, updated, dup_errors = import_loads(db, valid, user_id, upsert)
+        errors = sorted(errors + dup_errors, key=lambda e: e["row"])
+    return {
+        "rows": len(df), "inserted": inserted, "updated": updated,
+        "error_count": len(errors), "errors": errors[:MAX_REPORTED_ERRORS],
+        "upsert": upsert,
+    }
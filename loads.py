@@ -1,10 +1,24 @@
 # loads.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response, Response, session, abort
 from flask_login import login_required, current_user
-from db import SessionLocal
-from models import Load, Shift
+from db import SessionLocal, ReadSession
+from models import Load, LoadCreateKey, BoardState, KpiDirtyDay, Shift, parse_ship_date, operational_day, typed_values
+from datetime import datetime
+from sqlalchemy import update, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+import hashlib
+import logging
+import os
+import board_cache
+from board import build_board
+from markupsafe import Markup
+import events
+import jobs
+import metrics
+from logging_setup import should_sample
 
 loads_bp = Blueprint("loads", __name__)
+log = logging.getLogger("logitrans.loads")
 
 def add_no_cache_headers(response):
     """Dodaj nagłówki anti-cache do odpowiedzi"""
@@ -15,129 +29,258 @@ def add_no_cache_headers(response):
     response.headers['Vary'] = 'Accept-Encoding'
     return response
 
+
+def _release_tag():
+    """Identyfikator wdrożenia - nowe szablony muszą unieważnić stare ETagi"""
+    release = os.getenv("RELEASE") or os.getenv("RENDER_GIT_COMMIT")
+    if release:
+        return release
+    h = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for folder in ("templates", "static"):
+        for dirpath, _, files in sorted(os.walk(os.path.join(base, folder))):
+            for name in sorted(files):
+                with open(os.path.join(dirpath, name), "rb") as f:
+                    h.update(f.read())
+    return h.hexdigest()[:16]
+
+RELEASE_TAG = _release_tag()
+
+
+def make_etag(*parts):
+    """Silny ETag z wersji danych i parametrów odpowiedzi (stabilny między workerami)"""
+    raw = "|".join(str(p) for p in (RELEASE_TAG,) + parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def user_etag_parts():
+    """Strona zależy od roli i nazwy zalogowanego użytkownika"""
+    return current_user.get_id(), current_user.role.name, current_user.full_name
+
+
+def add_revalidate_headers(response, etag):
+    """Przeglądarka może trzymać odpowiedź, ale przed użyciem musi ją zweryfikować"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Cookie, Accept-Encoding'
+    return response
+
+
+def not_modified(etag):
+    return add_revalidate_headers(Response(status=304), etag)
+
+# Pola, które można edytować z tablicy (formularze wierszy, autosave, batch)
+EDITABLE_FIELDS = ["seq","planned","done","lo_code","picker","status","time_slot","lane","trailer_no","ship_date"]
+CREATE_FIELDS = EDITABLE_FIELDS + ["area"]
+INT_FIELDS = ["seq","planned","done"]
+
+def apply_updates(l, updates):
+    """Ustawia pola rekordu; zwraca słownik faktycznie zmienionych pól"""
+    changed = {}
+    for k, v in updates.items():
+        # tylko jeśli atrybut istnieje w modelu
+        if hasattr(l, k):
+            v = v if v != "" else None
+            if getattr(l, k) != v:
+                changed[k] = v
+            setattr(l, k, v)
+    return changed
+
+def update_lane(db, time_slot, lane, values, version, day=None):
+    """Jeden UPDATE ... WHERE time_slot=? AND lane=? [AND ship_day=?] dla całej karty.
+
+    Bez ładowania obiektów ORM; zwraca liczbę zmienionych wierszy (rowcount).
+    Zmienione wiersze dostają wersję tablicy `version` (delta-sync).
+    """
+    where = [Load.time_slot == time_slot, Load.lane == lane]
+    if day:
+        where.append(Load.ship_day == day)
+    values = typed_values(values)
+    if "ship_day" in values:
+        # karta przenoszona na inny dzień - stare dni do przeliczenia w KPI
+        db.execute(insert(KpiDirtyDay).from_select(["ship_day"], select(Load.ship_day).where(*where).distinct()))
+    stmt = (
+        update(Load).where(*where)
+        .values(**values, revision=version, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(stmt).rowcount
+
+def board_window():
+    """Parametry okna tablicy z query stringa: (dzień albo None dla 'all', zmiana albo None)"""
+    raw_day = (request.args.get("ship_date") or "").strip()
+    day = None if raw_day == "all" else (parse_ship_date(raw_day) or operational_day())
+    raw_shift = (request.args.get("shift") or "").strip().upper()
+    shift = Shift[raw_shift] if raw_shift in Shift.__members__ else None
+    return day, shift
+
+def clean_fields(raw, allowed):
+    """Walidacja pól z JSON (batch): liczby na int, puste na None, lane wielkimi literami.
+
+    W przeciwieństwie do formularzy niepoprawna liczba to błąd, a nie ciche None.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Pole 'fields' musi być obiektem")
+    unknown = set(raw) - set(allowed)
+    if unknown:
+        raise ValueError(f"Nieznane pola: {', '.join(sorted(unknown))}")
+    out = {}
+    for k, v in raw.items():
+        if isinstance(v, str):
+            v = v.strip()
+        if v in (None, ""):
+            out[k] = None
+        elif k in INT_FIELDS:
+            try:
+                out[k] = int(v)
+            except (TypeError, ValueError):
+                raise ValueError(f"Niepoprawna liczba w polu {k}: {v!r}")
+        else:
+            out[k] = str(v).upper() if k == "lane" else str(v)
+    return out
+
+def log_board_summary(board, version, filter_time, day, shift):
+    """Diagnostyka tablicy (losowana próbka żądań, poziom DEBUG)"""
+    slots = {}
+    for ts, data in board.items():
+        headers = data.get("headers", {})
+        lanes = data.get("lanes", {})
+        slots[ts] = {
+            "lanes": len(lanes),
+            "rows": sum(len(rows) for rows in lanes.values()),
+            "missing_headers": sorted(lane for lane in lanes if lane not in headers),
+        }
+    log.debug("board", extra={
+        "board_version": version, "filter_time": filter_time, "day": day,
+        "shift": shift.name if shift else None, "slots": slots,
+    })
+
+def lane_card(ts, lane, data, board_day):
+    """HTML karty pasa z cache fragmentów - renderowany tylko, gdy zmieniła się treść karty.
+
+    Wariant karty zależy od slotu, dnia tablicy (ukryte pola formularzy) i tego,
+    czy użytkownik widzi przycisk WYCZYŚĆ.
+    """
+    key = board_cache.lane_key(data, lane, ts, board_day, current_user.role.name == "USER")
+    html, hit = board_cache.get_fragment(key, lambda: render_template(
+        "_lane.html", ts=ts, lane=lane, rows=data["lanes"][lane], data=data, board_day=board_day))
+    metrics.inc("board_fragment_cache_total", {"result": "hit" if hit else "miss"})
+    return Markup(html)
+
 @loads_bp.route("/loads", methods=["GET"])
 @login_required
 def list_loads():
-    # Debug: sprawdź sesję użytkownika
-    print(f"=== SESSION DEBUG ===")
-    print(f"Current user: {current_user.email}")
-    print(f"User full name: {current_user.full_name}")
-    print(f"User role: {current_user.role.name}")
-    print(f"Session ID: {request.cookies.get('session', 'NO SESSION')}")
-    print(f"User-Agent: {request.headers.get('User-Agent', 'NO USER-AGENT')[:50]}...")
     filter_time = request.args.get("time_slot")
-    with SessionLocal() as db:
-        q = db.query(Load).order_by(Load.time_slot, Load.lane, Load.seq)
-        if filter_time:
-            q = q.filter(Load.time_slot == filter_time)
-        items = q.all()
-
-    board = {}
-    for r in items:
-        ts = r.time_slot or "-"
-        data = board.setdefault(ts, {"trailers": set(), "lanes": {}})
-        # Ustaw ship_date tylko jeśli jeszcze nie jest ustawione lub jeśli nowy rekord ma datę
-        if "ship_date" not in data or (getattr(r, "ship_date", "") and not data["ship_date"]):
-            data["ship_date"] = getattr(r, "ship_date", "")
-        if r.trailer_no:
-            data["trailers"].add(r.trailer_no)
-        lane = (r.lane or "L01").upper()
-        data["lanes"].setdefault(lane, []).append(r)
-
-    # 3 stałe pasy i sortowanie po seq
-    fixed_lanes = ["L01", "L02", "L03"]
-    
-    # Jeśli board jest pusty (brak danych w bazie), dodaj domyślny time slot
-    if not board:
-        board["17:00"] = {"trailers": set(), "lanes": {}, "ship_date": ""}
-    
-    for ts, data in board.items():
-        data["trailer_text"] = ", ".join(sorted(data["trailers"])) if data["trailers"] else "00000000"
+    day, shift = board_window()
+    view = (filter_time or "", day, shift.name if shift else "") + user_etag_parts()
+    # komunikaty flash są jednorazowe - taka strona nie może trafić do cache przeglądarki
+    cacheable = not session.get("_flashes")
 
-        # upewnij się, że mamy klucze dla wszystkich pasów
-        for ln in fixed_lanes:
-            data["lanes"].setdefault(ln, [])
-        data["lanes"] = {ln: data["lanes"].get(ln, []) for ln in fixed_lanes}
-        
-        # Ustaw nagłówki dla każdego pasa
-        data["headers"] = {}
-        for ln in fixed_lanes:
-            # Znajdź pierwszy rekord dla tego pasa, żeby pobrać nagłówki
-            first_record = None
-            for r in data["lanes"][ln]:
-                if r:
-                    first_record = r
-                    break
-            
-            if first_record:
-                data["headers"][ln] = {
-                    "trailer": first_record.trailer_no or "00000000",
-                    "status": first_record.status or "PL",
-                    "time_slot": first_record.time_slot or ts,
-                    "ship_date": getattr(first_record, "ship_date", "") or ""
-                }
-            else:
-                # Domyślne wartości jeśli brak rekordów
-                data["headers"][ln] = {
-                    "trailer": "00000000",
-                    "status": "PL", 
-                    "time_slot": ts,
-                    "ship_date": data.get("ship_date", "") or ""
-                }
-
-        # --- BEZPIECZNE SORTOWANIE PO SEQ (int/str/None) ---
-        def seq_key(row):
-            v = getattr(row, "seq", None)
-            try:
-                return (v is None, int(v))  # None idzie na koniec; reszta rzutowana na int
-            except Exception:
-                return (True, 10 ** 9)  # cokolwiek „dziwnego” ląduje na końcu
+    with ReadSession() as db:
+        if cacheable and request.if_none_match:
+            etag = make_etag("board", board_cache.current_version(db), *view)
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+        board_version, board = board_cache.get_board(
+            db, ("board", filter_time or "", day, shift),
+            lambda db: build_board(db, filter_time, day, shift))
 
-        for ln in fixed_lanes:
-            data["lanes"][ln].sort(key=seq_key)
+    if should_sample() and log.isEnabledFor(logging.DEBUG):
+        log_board_summary(board, board_version, filter_time, day, shift)
 
-    # Debug: sprawdź czy nagłówki są ustawione
-    print("=== DEBUG: Board data ===")
-    for ts, data in board.items():
-        print(f"Time slot: {ts}")
-        print(f"  Headers: {data.get('headers', 'NOT SET')}")
-        print(f"  Ship date: {data.get('ship_date', 'NOT SET')}")
-        for lane, rows in data.get('lanes', {}).items():
-            print(f"  Lane {lane}: {len(rows)} rows")
-            if rows:
-                first_row = rows[0]
-                print(f"    First row trailer: {getattr(first_row, 'trailer_no', 'None')}")
-                print(f"    First row status: {getattr(first_row, 'status', 'None')}")
-                print(f"    First row time_slot: {getattr(first_row, 'time_slot', 'None')}")
-                print(f"    First row ship_date: {getattr(first_row, 'ship_date', 'None')}")
-            
-            # Sprawdź nagłówki dla tego pasa
-            if 'headers' in data and lane in data['headers']:
-                hdr = data['headers'][lane]
-                print(f"    Header trailer: {hdr.get('trailer', 'None')}")
-                print(f"    Header status: {hdr.get('status', 'None')}")
-                print(f"    Header time_slot: {hdr.get('time_slot', 'None')}")
-                print(f"    Header ship_date: {hdr.get('ship_date', 'None')}")
-            else:
-                print(f"    Header for {lane}: NOT FOUND")
-    
-    # Debug: sprawdź czy template otrzyma poprawne dane
-    print("=== DEBUG: Template data ===")
-    for ts, data in board.items():
-        print(f"Time slot: {ts}")
-        if 'headers' in data:
-            for lane, hdr in data['headers'].items():
-                print(f"  Lane {lane}:")
-                print(f"    Template will get trailer: {hdr.get('trailer', 'None')}")
-                print(f"    Template will get status: {hdr.get('status', 'None')}")
-                print(f"    Template will get time_slot: {hdr.get('time_slot', 'None')}")
-                print(f"    Template will get ship_date: {hdr.get('ship_date', 'None')}")
-        else:
-            print(f"  No headers found for time slot {ts}")
-    
-    response = make_response(render_template("dashboard.html", board=board, filter_time=filter_time or ""))
-    response.headers['ETag'] = f'"{hash(str(board))}"'
-    return add_no_cache_headers(response)
+    board_day = day.isoformat() if day else ""
+    response = make_response(render_template("dashboard.html", board=board, filter_time=filter_time or "",
+                                             board_version=board_version, board_day=board_day,
+                                             filter_shift=shift.name if shift else "",
+                                             lane_card=lambda ts, lane, data: lane_card(ts, lane, data, board_day)))
+    if not cacheable:
+        return add_no_cache_headers(response)
+    return add_revalidate_headers(response, make_etag("board", board_version, *view))
+
+
+@loads_bp.route("/loads/lane", methods=["GET"])
+@login_required
+def lane_fragment():
+    """Jedna karta pasa jako fragment HTML - klient podmienia nią kartę po zmianie.
+
+    Parametry: `time_slot` i `lane` wskazują kartę, ship_date/shift - okno
+    tablicy jak w /loads. Budowany jest tylko ten slot (osobny wpis w cache
+    tablicy), a karta pochodzi z cache fragmentów. 404 - slotu nie ma już na
+    tablicy, klient przeładowuje wtedy całą stronę.
+    """
+    ts = (request.args.get("time_slot") or "").strip()
+    lane = (request.args.get("lane") or "").strip().upper()
+    day, shift = board_window()
+    # "-" to slot rekordów bez godziny - tego nie da się odfiltrować po time_slot
+    filter_time = ts if ts != "-" else None
+    with ReadSession() as db:
+        board_version, board = board_cache.get_board(
+            db, ("board", filter_time or "", day, shift),
+            lambda db: build_board(db, filter_time, day, shift))
+    data = board.get(ts)
+    # slot bez rekordów (pusta tablica daje domyślny slot) też znika z pełnej strony
+    if data is None or lane not in data["lanes"] or not any(data["lanes"].values()):
+        abort(404)
+
+    board_day = day.isoformat() if day else ""
+    etag = make_etag("lane", *board_cache.lane_key(data, lane, ts, board_day), *user_etag_parts())
+    if request.if_none_match.contains(etag):
+        response = not_modified(etag)
+    else:
+        response = add_revalidate_headers(make_response(lane_card(ts, lane, data, board_day)), etag)
+    # wersja tablicy, z której pochodzi karta - klient odrzuca kartę starszą niż jego kursor
+    # (odczyt z opóźnionej repliki); także przy 304, bo przeglądarka aktualizuje nim nagłówki z cache
+    response.headers["X-Board-Version"] = str(board_version)
+    return response
+
+
+# Pola wysyłane klientowi przy synchronizacji - tylko to, czego używa tablica
+SYNC_FIELDS = ["id", "time_slot", "lane", "area", "seq", "planned", "done",
+               "lo_code", "picker", "status", "trailer_no", "ship_date", "ship_day", "revision"]
+
+def load_to_dict(l):
+    d = {f: getattr(l, f) for f in SYNC_FIELDS}
+    d["ship_day"] = l.ship_day.isoformat() if l.ship_day else None
+    return d
+
+
+@loads_bp.route("/loads/changes", methods=["GET"])
+@login_required
+def load_changes():
+    """Delta-sync: rekordy utworzone/zmienione/usunięte od podanego kursora"""
+    since = request.args.get("since", type=int)
+    if since is None:
+        return {"success": False, "error": "Brak parametru since"}, 400
+
+    with ReadSession() as db:
+        state = db.get(BoardState, board_cache.BOARD_STATE_ID)
+        etag = make_etag("changes", since, state.version if state else 0,
+                         state.pruned_revision if state else 0)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        cursor, changed, deleted, reset = board_cache.changes_since(db, since)
+        payload = {
+            "cursor": cursor,
+            "reset": reset,
+            "changed": [load_to_dict(l) for l in changed],
+            "deleted": [{"id": t.load_id, "time_slot": t.time_slot, "lane": t.lane, "area": t.area,
+                         "ship_day": t.ship_day.isoformat() if t.ship_day else None}
+                        for t in deleted],
+        }
+    return add_revalidate_headers(jsonify(payload), etag)
+
+
+@loads_bp.route("/loads/stream", methods=["GET"])
+@login_required
+def load_stream():
+    """Server-Sent Events: zdarzenia zmian tablicy wypychane do podłączonych ekranów"""
+    with SessionLocal() as db:
+        cursor = board_cache.current_version(db)
+    sub = events.broadcaster.subscribe()
+    response = Response(events.sse_stream(sub, cursor), mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'   # bez buforowania w nginx/proxy
+    return response
 
 
 @loads_bp.route("/loads", methods=["POST"])
@@ -179,9 +322,14 @@ def create_load():
             created_by_id=current_user.id
         )
         db.add(l)
+        version = board_cache.stamp(db, l)
+        db.flush()
+        events.record(db, version, "create", l.id, l.time_slot, l.lane, load_to_dict(l),
+                      ship_day=l.ship_day)
         db.commit()
+        day = l.ship_day
 
-    return redirect(url_for("loads.list_loads", time_slot=time_slot))
+    return redirect(url_for("loads.list_loads", time_slot=time_slot, ship_date=day.isoformat()))
 
 @loads_bp.route("/loads/<int:load_id>/delete", methods=["POST"])
 @login_required
@@ -191,6 +339,10 @@ def delete_load(load_id):
         if not l:
             flash("Nie znaleziono rekordu", "error")
         else:
+            version = board_cache.bump_version(db)
+            board_cache.record_deletes(db, [l], version)
+            events.record(db, version, "delete", l.id, l.time_slot, l.lane, {"area": l.area},
+                          ship_day=l.ship_day)
             db.delete(l)
             db.commit()
             flash("Usunięto rekord", "success")
@@ -205,11 +357,10 @@ def edit_load(load_id):
         flash("Nie masz uprawnień do edycji danych", "error")
         return redirect(url_for("loads.list_loads"))
     
-    fields = ["seq","planned","done","lo_code","picker","status","time_slot","lane","trailer_no","ship_date"]
-    updates = {f: request.form.get(f) for f in fields if f in request.form}
+    updates = {f: request.form.get(f) for f in EDITABLE_FIELDS if f in request.form}
 
     # konwersje liczb
-    for k in ["seq","planned","done"]:
+    for k in INT_FIELDS:
         if k in updates and updates[k] not in (None, "", "None"):
             try: updates[k] = int(updates[k])
             except ValueError: updates[k] = None
@@ -224,10 +375,12 @@ def edit_load(load_id):
         else:
             # Zapisz time_slot przed zamknięciem sesji
             current_time_slot = l.time_slot
-            for k, v in updates.items():
-                # tylko jeśli atrybut istnieje w modelu
-                if hasattr(l, k):
-                    setattr(l, k, v if v != "" else None)
+            changed = apply_updates(l, updates)
+            if changed:
+                version = board_cache.stamp(db, l)
+                db.flush()
+                events.record(db, version, "update", l.id, l.time_slot, l.lane, changed,
+                              ship_day=l.ship_day)
             db.commit()
     
     # Sprawdź czy to AJAX request
@@ -238,6 +391,106 @@ def edit_load(load_id):
     return redirect(url_for("loads.list_loads", time_slot=updates.get("time_slot") or current_time_slot))
 
 
+MAX_BATCH = 500
+
+@loads_bp.route("/loads/batch", methods=["POST"])
+@login_required
+def batch_save():
+    """Zapis wielu wierszy w jednej transakcji (autosave całej tablicy jednym żądaniem).
+
+    Wejście (JSON): {"patches": [{"id": 12, "fields": {...}},
+                                 {"key": "create-17:00-L01-J05", "client_key": "…", "fields": {...}}]}
+    Patch bez `id` tworzy nowy rekord. `client_key` (losowy, nadany przez
+    przeglądarkę) czyni tworzenie idempotentnym: ponowienie po zgubionej
+    odpowiedzi zwraca id rekordu utworzonego za pierwszym razem. Każdy patch ma
+    własny SAVEPOINT, więc błąd jednego wiersza nie cofa pozostałych; odpowiedź
+    zawiera wynik per wiersz.
+    """
+    data = request.get_json(silent=True)
+    patches = data.get("patches") if isinstance(data, dict) else data
+    if not isinstance(patches, list) or not patches:
+        return {"success": False, "error": "Brak listy zmian"}, 400
+    if len(patches) > MAX_BATCH:
+        return {"success": False, "error": f"Maksymalnie {MAX_BATCH} zmian w jednym żądaniu"}, 413
+
+    can_edit = current_user.role.name != 'USER'
+    results = []
+    with SessionLocal() as db:
+        # jedna wersja na cały batch - podbita poza SAVEPOINT-ami, więc cofnięcie
+        # pojedynczego wiersza jej nie unieważnia
+        version = board_cache.bump_version(db)
+        now = datetime.utcnow()
+        any_changed = False
+        for p in patches:
+            p = p if isinstance(p, dict) else {}
+            load_id = p.get("id")
+            res = {"key": p.get("key"), "id": load_id, "success": False}
+            results.append(res)
+            client_key = str(p.get("client_key") or "")[:64] or None
+            try:
+                fields = clean_fields(p.get("fields") or {}, CREATE_FIELDS if load_id is None else EDITABLE_FIELDS)
+                row_changed = False
+                created = db.get(LoadCreateKey, client_key) if load_id is None and client_key else None
+                if created is not None:
+                    # ten wiersz już zapisaliśmy - ponowienie po zgubionej odpowiedzi
+                    res["id"] = created.load_id
+                    res["success"] = True
+                    continue
+                with db.begin_nested():
+                    if load_id is None:
+                        l = Load(
+                            time_slot=fields.get("time_slot") or "17:00",
+                            lane=fields.get("lane") or "L01",
+                            **{k: v for k, v in fields.items() if k not in ("time_slot", "lane")},
+                            shift=Shift.A,
+                            created_by_id=current_user.id,
+                        )
+                        l.revision, l.updated_at = version, now
+                        db.add(l)
+                        db.flush()
+                        events.record(db, version, "create", l.id, l.time_slot, l.lane, load_to_dict(l),
+                                      ship_day=l.ship_day)
+                        if client_key:
+                            db.add(LoadCreateKey(key=client_key, load_id=l.id, created_at=now))
+                            db.flush()
+                        res["id"] = l.id
+                        row_changed = True
+                    else:
+                        if not can_edit:
+                            raise PermissionError("Nie masz uprawnień do edycji danych")
+                        l = db.get(Load, int(load_id))
+                        if not l:
+                            raise LookupError("Nie znaleziono rekordu")
+                        changed = apply_updates(l, fields)
+                        if changed:
+                            l.revision, l.updated_at = version, now
+                            db.flush()
+                            events.record(db, version, "update", l.id, l.time_slot, l.lane, changed,
+                                          ship_day=l.ship_day)
+                            row_changed = True
+                any_changed = any_changed or row_changed
+                res["success"] = True
+            except (ValueError, TypeError, PermissionError, LookupError) as e:
+                res["error"] = str(e)
+            except SQLAlchemyError as e:
+                created = db.get(LoadCreateKey, client_key) if load_id is None and client_key else None
+                if created is not None:
+                    # równoległe żądanie z tym samym kluczem (np. sendBeacon) zdążyło pierwsze
+                    res["id"], res["success"] = created.load_id, True
+                else:
+                    res["error"] = f"Błąd zapisu: {e.__class__.__name__}"
+        if any_changed:
+            db.commit()
+        else:
+            # same puste zmiany albo błędy - cofamy też podbicie wersji, żeby nie
+            # unieważniać cache tablicy, kart i ETagów wszystkich klientów
+            db.rollback()
+        cursor = board_cache.current_version(db)
+
+    response = jsonify({"success": all(r["success"] for r in results), "cursor": cursor, "results": results})
+    return add_no_cache_headers(response)
+
+
 # ——— Nagłówek: trailer / time / status / (NEW) ship_date ———
 @loads_bp.route("/loads/update_header", methods=["POST"])
 @login_required
@@ -253,27 +506,32 @@ def update_header():
     trailer_no = (request.form.get("trailer_no") or "").strip()
     status = (request.form.get("status") or "").strip()
     ship_date = (request.form.get("ship_date") or "").strip()   # <-- NOWOŚĆ
+    day = parse_ship_date(request.form.get("ship_day"))         # dzień karty (tablica okienkowana)
 
     if not orig_time_slot or not lane:
         flash("Brak wymaganych danych nagłówka", "error")
         return redirect(url_for("loads.list_loads", time_slot=orig_time_slot or None))
 
+    # zmieniamy tylko pola, które przyszły niepuste
+    changed = {k: v for k, v in [("trailer_no", trailer_no), ("time_slot", new_time_slot),
+                                 ("status", status), ("ship_date", ship_date)] if v}
+
     with SessionLocal() as db:
-        # pobierz wszystkie rekordy z tej karty (lane + orig_time_slot)
-        rows = db.query(Load).filter(Load.time_slot == orig_time_slot, Load.lane == lane).all()
-        if not rows:
+        # jeden UPDATE dla wszystkich rekordów z tej karty (lane + orig_time_slot)
+        version = board_cache.bump_version(db)
+        count = update_lane(db, orig_time_slot, lane, changed, version, day) if changed else 0
+        if not count:
+            db.rollback()
             flash("Brak wierszy do aktualizacji dla tej kolumny", "warning")
         else:
-            for r in rows:
-                if trailer_no:    r.trailer_no = trailer_no
-                if new_time_slot: r.time_slot = new_time_slot
-                if status:        r.status = status
-                if ship_date:     r.ship_date = ship_date   # <-- zapisujemy datę
+            events.record(db, version, "lane", None, orig_time_slot, lane, changed, ship_day=day)
             db.commit()
-            flash(f"Zaktualizowano nagłówek kolumny {lane} ({len(rows)} wierszy)", "success")
+            flash(f"Zaktualizowano nagłówek kolumny {lane} ({count} wierszy)", "success")
 
-    # Po zmianie TIME przenosimy widok na nowy slot (jeśli został podany)
-    response = redirect(url_for("loads.list_loads", time_slot=new_time_slot or orig_time_slot))
+    # Po zmianie TIME (lub daty) przenosimy widok na nowy slot (jeśli został podany)
+    new_day = parse_ship_date(ship_date) or day
+    response = redirect(url_for("loads.list_loads", time_slot=new_time_slot or orig_time_slot,
+                                ship_date=new_day.isoformat() if new_day else None))
     return add_no_cache_headers(response)
 
 
@@ -288,28 +546,85 @@ def clear_lane():
     
     time_slot = request.form.get("time_slot", "").strip()
     lane = request.form.get("lane", "").strip().upper()
+    day = parse_ship_date(request.form.get("ship_day"))
     
     if not time_slot or not lane:
         flash("Brak wymaganych danych", "error")
         return redirect(url_for("loads.list_loads"))
     
+    # Wyczyść pola: planned, done, lo_code, picker
+    cleared = {"planned": None, "done": None, "lo_code": None, "picker": None}
+
     with SessionLocal() as db:
-        # Znajdź wszystkie rekordy dla danej kolumny i czasu
-        rows = db.query(Load).filter(Load.time_slot == time_slot, Load.lane == lane).all()
+        # jeden UPDATE dla wszystkich rekordów danej kolumny i czasu
+        version = board_cache.bump_version(db)
+        count = update_lane(db, time_slot, lane, cleared, version, day)
         
-        if not rows:
+        if not count:
+            db.rollback()
             flash(f"Brak danych do wyczyszczenia w kolumnie {lane}", "warning")
         else:
-            # Wyczyść pola: planned, done, lo_code, picker
-            for row in rows:
-                row.planned = None
-                row.done = None
-                row.lo_code = None
-                row.picker = None
-            
+            events.record(db, version, "lane", None, time_slot, lane, cleared, ship_day=day)
             db.commit()
-            flash(f"Wyczyszczono dane w kolumnie {lane} ({len(rows)} rekordów)", "success")
+            flash(f"Wyczyszczono dane w kolumnie {lane} ({count} rekordów)", "success")
     
-    return redirect(url_for("loads.list_loads", time_slot=time_slot))
+    return redirect(url_for("loads.list_loads", time_slot=time_slot,
+                            ship_date=day.isoformat() if day else None))
+
 
+@loads_bp.route("/loads/import", methods=["GET", "POST"])
+@login_required
+def import_loads():
+    """Import planu z pliku xlsx/csv - zlecany jako zadanie w tle (jobs.py)"""
+    if current_user.role.name == 'USER':
+        flash("Nie masz uprawnień do importu danych", "error")
+        return redirect(url_for("loads.list_loads"))
+    if request.method == "GET":
+        return render_template("loads_import.html", report=None)
 
+    file = request.files.get("file")
+    if not file:
+        flash("Dodaj plik z planem", "error")
+        return redirect(url_for("loads.import_loads"))
+    upsert = request.form.get("upsert") == "1"
+
+    # wczytanie (także sprawdzenie formatu), walidację i zapis robi worker zadań -
+    # żądanie kończy się od razu, a proces WWW nie ładuje pandas
+    job_id = jobs.submit("load_import", {"path": jobs.save_upload(file), "filename": file.filename,
+                                         "user_id": current_user.id, "upsert": upsert}, current_user.id)
+    return jobs.accepted(job_id)
+
+
+@loads_bp.route("/loads/import/jobs/<int:job_id>", methods=["GET"])
+@login_required
+def import_job_result(job_id):
+    """Raport zakończonego zadania importu"""
+    with ReadSession() as db:
+        report = jobs.job_result(jobs.job_for_user(db, job_id))
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(report)
+    return render_template("loads_import.html", report=report)
+
+
+
+@loads_bp.route("/loads/export", methods=["GET"])
+@login_required
+def export_loads():
+    """Eksport tablicy do CSV/XLSX: ?format=csv|xlsx&from=..&to=.. (domyślnie bieżący dzień)"""
+    import load_export
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in load_export.FORMATS:
+        return jsonify({"error": "format musi być csv albo xlsx"}), 400
+    day_to = parse_ship_date(request.args.get("to")) or operational_day()
+    day_from = parse_ship_date(request.args.get("from")) or day_to
+    if day_from > day_to:
+        day_from, day_to = day_to, day_from
+    if (day_to - day_from).days >= load_export.EXPORT_MAX_DAYS:
+        return jsonify({"error": f"zakres eksportu to maksymalnie {load_export.EXPORT_MAX_DAYS} dni"}), 400
+
+    # sesję zamyka generator - po wysłaniu ostatniego kawałka albo po zerwaniu połączenia
+    db = ReadSession()
+    filename = f"tablica_{day_from.isoformat()}_{day_to.isoformat()}.{fmt}"
+    response = Response(load_export.generate(db, fmt, day_from, day_to), mimetype=load_export.FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return add_no_cache_headers(response)
@@ -0,0 +1,163 @@
+# logging_setup.py
+"""
+Logowanie strukturalne aplikacji.
+
+Rekordy są formatowane jako JSON (jeden obiekt na linię) z identyfikatorem
+żądania (`request_id`), użytkownikiem i endpointem. Zapis jest nieblokujący:
+handler w wątku żądania tylko wrzuca rekord do kolejki, a formatowanie i
+zapis na stdout robi osobny wątek `QueueListener`.
+
+Zmienne środowiskowe:
+    LOG_LEVEL         poziom logowania (domyślnie INFO)
+    LOG_FORMAT        json | text (domyślnie json)
+    LOG_BOARD_SAMPLE  ułamek żądań /loads z diagnostyką tablicy (0.0-1.0, domyślnie 0)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, request, has_request_context
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_BOARD_SAMPLE = float(os.getenv("LOG_BOARD_SAMPLE", "0"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# standardowe atrybuty LogRecord - wszystko inne to pola przekazane przez `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_targets = ()         # handlery zapisu, obsługiwane przez wątek listenera
+_listener = None
+_listener_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden rekord = jeden obiekt JSON"""
+
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and not k.startswith("_"):
+                out[k] = v
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """Dopisuje do rekordu request_id, użytkownika i endpoint (w wątku żądania)"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.endpoint = request.endpoint
+            # tylko już załadowany użytkownik - log nie może wywołać zapytania do bazy
+            user = g.get("_login_user")
+            if user is not None and user.is_authenticated:
+                record.user_id = user.get_id()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, który zachowuje pola `extra` (formatowanie robi listener)"""
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _ensure_listener(handler):
+    """Uruchamia wątek zapisu logów (ponownie po fork() workera)"""
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+    _listener = logging.handlers.QueueListener(handler.queue, *_targets, respect_handler_level=True)
+    _listener_pid = os.getpid()
+    _listener.start()
+
+
+def restart_listener():
+    """Do wołania po fork() (np. w post_fork gunicorna)"""
+    for h in logging.getLogger().handlers:
+        if isinstance(h, _QueueHandler):
+            _ensure_listener(h)
+
+
+def stop_listener():
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Podpina do root loggera nieblokujący handler (wołać raz przy starcie)"""
+    global _targets
+    root = logging.getLogger()
+    if any(isinstance(h, _QueueHandler) for h in root.handlers):
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+                                              defaults={"request_id": "-"}))
+
+    handler = _QueueHandler(queue.SimpleQueue())
+    _targets = (stream,)
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    _ensure_listener(handler)
+    atexit.register(stop_listener)
+
+
+def should_sample(rate=LOG_BOARD_SAMPLE):
+    """Losowanie żądań do szczegółowej diagnostyki"""
+    return rate > 0 and random.random() < rate
+
+
+# ——— identyfikator żądania ———
+
+def _before_request():
+    rid = request.headers.get(REQUEST_ID_HEADER, "")
+    g.request_id = rid if _REQUEST_ID_RE.match(rid) else uuid.uuid4().hex
+    g._log_start = time.perf_counter()
+
+
+def _after_request(response):
+    rid = g.get("request_id")
+    if rid:
+        response.headers[REQUEST_ID_HEADER] = rid
+    log = logging.getLogger("logitrans.access")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("request", extra={
+            "method": request.method, "path": request.path, "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - g.get("_log_start", time.perf_counter())) * 1000, 1),
+        })
+    return response
+
+
+def init_app(app):
+    configure_logging()
+    app.before_request(_before_request)
+    app.after_request(_after_request)
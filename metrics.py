@@ -0,0 +1,275 @@
+# metrics.py
+"""
+Metryki aplikacji w formacie tekstowym Prometheusa (/metrics, tylko ADMIN).
+
+Zbieramy per żądanie: czas odpowiedzi (histogram per endpoint), liczbę
+żądań wg statusu, liczbę zapytań SQL i łączny czas bazy (zdarzenia silnika
+SQLAlchemy na `db.engine`) oraz czas renderowania szablonów.
+
+Każdy proces trzyma liczniki w pamięci i co METRICS_FLUSH_SECONDS zapisuje
+je do pliku `<METRICS_DIR>/metrics-<pid>.json`. /metrics sumuje wszystkie
+pliki, więc przy wielu workerach gunicorna widać dane całej aplikacji.
+
+Proces główny gunicorna czyści katalog przy starcie (reset_dir), a plik
+zakończonego workera dolicza do `metrics-retired.json` i usuwa (retire) -
+liczniki wymienianych workerów nie giną i nie rosną pliki po martwych PID.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from flask import Blueprint, Response, g, request, has_request_context, before_render_template, template_rendered
+from flask_login import login_required
+from sqlalchemy import event
+from models import Role
+from auth import require_roles
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "logitrans-metrics"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1.0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# nazwa -> (typ, opis, kubełki histogramu)
+METRICS = {
+    "http_requests_total": ("counter", "Liczba żądań HTTP wg endpointu, metody i statusu", None),
+    "http_request_duration_seconds": ("histogram", "Czas obsługi żądania", LATENCY_BUCKETS),
+    "http_request_db_statements": ("histogram", "Liczba zapytań SQL na żądanie", COUNT_BUCKETS),
+    "http_request_db_seconds": ("histogram", "Łączny czas zapytań SQL na żądanie", LATENCY_BUCKETS),
+    "db_statements_total": ("counter", "Liczba zapytań SQL wg endpointu", None),
+    "template_render_seconds": ("histogram", "Czas renderowania szablonu", LATENCY_BUCKETS),
+    "kpi_cache_requests_total": ("counter", "Wczytania pliku KPI wg wyniku cache (hit/miss)", None),
+    "board_fragment_cache_total": ("counter", "Karty pasów tablicy wg wyniku cache fragmentów (hit/miss)", None),
+}
+
+metrics_bp = Blueprint("metrics", __name__)
+
+_lock = threading.Lock()
+_values = {}          # (nazwa, etykiety) -> float albo [kubełki..., suma, liczba]
+_last_flush = 0.0
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, labels, amount=1.0):
+    k = _key(name, labels)
+    with _lock:
+        _values[k] = _values.get(k, 0.0) + amount
+
+
+def observe(name, labels, value):
+    buckets = METRICS[name][2]
+    k = _key(name, labels)
+    with _lock:
+        h = _values.get(k)
+        if h is None:
+            h = _values[k] = [0] * len(buckets) + [0.0, 0]
+        for i, le in enumerate(buckets):
+            if value <= le:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+# ——— zapis/odczyt stanu między procesami ———
+
+RETIRED_FILE = "metrics-retired.json"
+
+
+def _path(pid=None):
+    return os.path.join(METRICS_DIR, f"metrics-{pid or os.getpid()}.json")
+
+
+def _write_json(path, data):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(total, data):
+    """Dodaje wpisy [nazwa, etykiety, wartość] do słownika sum"""
+    for name, labels, value in data:
+        k = (name, tuple(tuple(l) for l in labels))
+        if isinstance(value, list):
+            cur = total.setdefault(k, [0] * len(value))
+            total[k] = [a + b for a, b in zip(cur, value)]
+        else:
+            total[k] = total.get(k, 0.0) + value
+
+
+def flush(force=False):
+    """Zapisuje stan procesu do pliku (atomowo, najwyżej co METRICS_FLUSH_SECONDS)"""
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < METRICS_FLUSH_SECONDS:
+        return
+    _last_flush = now
+    with _lock:
+        data = [[name, list(labels), value] for (name, labels), value in _values.items()]
+    _write_json(_path(), data)
+
+
+def collect():
+    """Sumuje stan ze wszystkich plików procesów i liczniki zakończonych workerów"""
+    total = {}
+    retired = _read_json(os.path.join(METRICS_DIR, RETIRED_FILE)) or {"values": [], "merging": []}
+    _merge(total, retired["values"])
+    # plik workera w trakcie doliczania jest już w sumie zakończonych - nie liczymy go dwa razy
+    skip = {os.path.basename(_path(pid)) for pid in retired["merging"]}
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics-*.json")):
+        name = os.path.basename(path)
+        if name == RETIRED_FILE or name in skip:
+            continue
+        data = _read_json(path)
+        if data is not None:
+            _merge(total, data)
+    return total
+
+
+def retire(pid):
+    """Dolicza plik zakończonego workera do sumy zakończonych i usuwa go.
+
+    Wołane w procesie głównym gunicorna (child_exit). Kolejność zapisów
+    sprawia, że /metrics w żadnym momencie nie liczy workera dwa razy ani
+    go nie gubi (licznik Prometheusa nie może się cofnąć).
+    """
+    path = _path(pid)
+    data = _read_json(path)
+    if data is None:
+        return
+    retired_path = os.path.join(METRICS_DIR, RETIRED_FILE)
+    retired = _read_json(retired_path) or {"values": [], "merging": []}
+    total = {}
+    _merge(total, retired["values"])
+    _merge(total, data)
+    values = [[name, list(labels), value] for (name, labels), value in total.items()]
+    _write_json(retired_path, {"values": values, "merging": [pid]})
+    os.remove(path)
+    # PID może zostać użyty ponownie przez nowego workera - jego plik znów się liczy
+    _write_json(retired_path, {"values": values, "merging": []})
+
+
+def reset_dir():
+    """Usuwa pliki metryk poprzedniego uruchomienia (start procesu głównego gunicorna)"""
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics-*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def render_text(values):
+    """Format tekstowy Prometheusa (wersja 0.0.4)"""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((k[1], v) for k, v in values.items() if k[0] == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind == "histogram":
+                for le, count in zip(buckets, value):
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', le)])} {count}")
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ——— podpięcie do Flaska i SQLAlchemy ———
+
+def _before_request():
+    g._m_start = time.perf_counter()
+    g._m_sql_count = 0
+    g._m_sql_time = 0.0
+
+
+def _after_request(response):
+    start = g.pop("_m_start", None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or "unknown"
+    inc("http_requests_total", {"endpoint": endpoint, "method": request.method, "status": str(response.status_code)})
+    # strumienie (SSE, eksporty) trwają tyle, ile klient jest podłączony - nie liczymy ich czasu
+    if not response.is_streamed:
+        labels = {"endpoint": endpoint}
+        observe("http_request_duration_seconds", labels, time.perf_counter() - start)
+        observe("http_request_db_statements", labels, g.get("_m_sql_count", 0))
+        observe("http_request_db_seconds", labels, g.get("_m_sql_time", 0.0))
+        if g.get("_m_sql_count"):
+            inc("db_statements_total", labels, g._m_sql_count)
+    flush()
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_m_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("_m_query_start")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context() and "_m_start" in g:
+        g._m_sql_count += 1
+        g._m_sql_time += elapsed
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("_m_tpl", []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    if has_request_context() and g.get("_m_tpl"):
+        observe("template_render_seconds", {"template": template.name or "?"},
+                time.perf_counter() - g._m_tpl.pop())
+
+
+def init_app(app, *engines):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    for engine in set(engines):
+        # fabryka może zbudować kilka aplikacji - silnik liczymy raz
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.register_blueprint(metrics_bp)
+    atexit.register(flush, True)
+
+
+@metrics_bp.route("/metrics")
+@login_required
+@require_roles(Role.ADMIN)
+def metrics_view():
+    flush(force=True)
+    return Response(render_text(collect()), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,64 @@
+# migrations.py
+"""
+Lekkie migracje schematu dla istniejących baz (bez Alembica).
+
+`create_all` tworzy tylko brakujące tabele - nie dodaje nowych kolumn ani
+indeksów do tabel, które już istnieją. Tutaj uzupełniamy te różnice,
+więc starą bazę (SQLite lokalnie, PostgreSQL na serwerze) wystarczy
+uruchomić z nowym kodem.
+"""
+import logging
+from sqlalchemy import inspect, text, select, update
+from models import Base, Load, parse_ship_date, parse_time_slot, operational_day
+
+BACKFILL_BATCH = 1000
+
+log = logging.getLogger("logitrans.migrations")
+
+
+def _add_missing_columns(conn, table):
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for col in table.columns:
+        if col.name in existing:
+            continue
+        ddl_type = col.type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {ddl_type}"))
+        log.info("%s: dodano kolumnę %s", table.name, col.name)
+
+
+def _backfill_typed_dates(conn):
+    """ship_date/time_slot (tekst) -> ship_day/slot_time dla starych wierszy.
+
+    Nieparsowalna lub pusta data -> dzień operacyjny z created_at, więc każdy
+    wiersz dostaje ship_day i krok wykonuje się tylko raz. Wiersze
+    z nieparsowalnym time_slot zostają z slot_time = NULL.
+    """
+    last_id, total = 0, 0
+    while True:
+        rows = conn.execute(
+            select(Load.id, Load.ship_date, Load.time_slot, Load.created_at)
+            .where(Load.id > last_id, Load.ship_day.is_(None))
+            .order_by(Load.id).limit(BACKFILL_BATCH)
+        ).all()
+        if not rows:
+            break
+        for r in rows:
+            conn.execute(update(Load).where(Load.id == r.id).values(
+                ship_day=parse_ship_date(r.ship_date) or operational_day(r.created_at),
+                slot_time=parse_time_slot(r.time_slot),
+            ))
+        last_id = rows[-1].id
+        total += len(rows)
+    if total:
+        log.info("loads: uzupełniono ship_day/slot_time w %d wierszach", total)
+
+
+def run_migrations(engine):
+    """Tworzy brakujące tabele, kolumny i indeksy"""
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            _add_missing_columns(conn, table)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        _backfill_typed_dates(conn)
@@ -1,7 +1,11 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy import String, Integer, DateTime, ForeignKey, Text, Enum, Float, Boolean, Date, Time, UniqueConstraint, Index
-from datetime import datetime
+from sqlalchemy import Table, Column
+from sqlalchemy import event, inspect, update, func
+from datetime import datetime, date, time, timedelta
 import enum
+import os
+import uuid
 
 class Base(DeclarativeBase):
     pass
@@ -19,6 +23,8 @@ class User(Base):
     full_name: Mapped[str] = mapped_column(String(255))
     role: Mapped[Role] = mapped_column(Enum(Role), default=Role.USER)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # zmienia się przy zmianie hasła/roli/e-maila/aktywności - unieważnia stare sesje
+    security_stamp: Mapped[str | None] = mapped_column(String(32), default=lambda: uuid.uuid4().hex)
     loads: Mapped[list["Load"]] = relationship(back_populates="created_by")
     
     def __str__(self):
@@ -27,6 +33,25 @@ class User(Base):
     def get_id(self):
         return str(self.id)
 
+# pola, których zmiana wymaga ponownego zalogowania użytkownika
+SECURITY_FIELDS = ("email", "password_hash", "role", "is_active")
+
+@event.listens_for(User, "before_update")
+def rotate_security_stamp(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[f].history.has_changes() for f in SECURITY_FIELDS):
+        target.security_stamp = uuid.uuid4().hex
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def bump_users_version(mapper, connection, target):
+    """Każda zmiana/usunięcie użytkownika podbija wspólną wersję (w tej samej transakcji) -
+    pozostałe workery porzucają wtedy swoje migawki z user_cache"""
+    connection.execute(
+        update(BoardState.__table__).where(BoardState.id == 1)   # board_cache.BOARD_STATE_ID
+        .values(users_version=func.coalesce(BoardState.users_version, 0) + 1)
+    )
+
 class Shift(enum.Enum):
     A = "A"
     B = "B"
@@ -34,9 +59,20 @@ class Shift(enum.Enum):
 
 class Load(Base):
     __tablename__ = "loads"
+    __table_args__ = (
+        # kolejność tablicy (ORDER BY time_slot, lane, seq) i filtry karty (time_slot + lane)
+        Index("ix_loads_board", "time_slot", "lane", "seq"),
+        # tablica ograniczona do dnia operacyjnego (ship_day = ?) w tej samej kolejności
+        Index("ix_loads_day_board", "ship_day", "time_slot", "lane", "seq"),
+        # nowe bazy SQLite nie używają ponownie id usuniętych/zarchiwizowanych rekordów
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    # śledzenie zmian (delta-sync): wersja tablicy z ostatniego zapisu rekordu
+    revision: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     time_slot: Mapped[str] = mapped_column(String(5), index=True, default="17:00")
     trailer_no: Mapped[str | None] = mapped_column(String(50), index=True, nullable=True)
@@ -58,8 +94,196 @@ class Load(Base):
     ship_date: Mapped[str | None] = mapped_column(String(20), nullable=True)   # <-- dodaliśmy
     area: Mapped[str | None] = mapped_column(String(10), nullable=True)        # <-- dodaliśmy
 
+    # typowane odpowiedniki ship_date/time_slot (wypełniane automatycznie, patrz sync_typed_columns)
+    ship_day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    slot_time: Mapped[time | None] = mapped_column(Time, nullable=True)
+
     shift: Mapped[Shift] = mapped_column(Enum(Shift))
     created_by_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     created_by: Mapped["User"] = relationship(back_populates="loads")
 
+class LoadArchive(Base):
+    """Zarchiwizowane ładunki: te same kolumny co `loads` + data archiwizacji.
+
+    Kolumny kopiujemy z `Load`, więc archiwum nie rozjedzie się ze schematem
+    tabeli głównej. Własny klucz `archive_id` (stare bazy SQLite mogą ponownie
+    użyć id z `loads`), bez klucza obcego do users i bez indeksów tablicy -
+    tylko indeksy przydatne w raportach.
+    """
+    __table__ = Table(
+        "loads_archive", Base.metadata,
+        Column("archive_id", Integer, primary_key=True),
+        *[Column(c.name, c.type, nullable=c.nullable) for c in Load.__table__.columns],
+        Column("archived_at", DateTime, nullable=False, default=datetime.utcnow),
+        Index("ix_loads_archive_id", "id"),
+        Index("ix_loads_archive_ship_day", "ship_day"),
+        Index("ix_loads_archive_created_at", "created_at"),
+    )
+
+# ——— Daty i godziny: tekst z formularzy -> typy Date/Time ———
+
+# dzień operacyjny zaczyna się o tej godzinie (nocna zmiana należy do dnia, w którym się zaczęła)
+OP_DAY_START_HOUR = int(os.getenv("OP_DAY_START_HOUR", "6"))
+
+SHIP_DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%d.%m.%y")
+TIME_SLOT_FORMATS = ("%H:%M", "%H:%M:%S", "%H.%M")
+
+def parse_ship_date(value) -> date | None:
+    """'04.10.2025' / '2025-10-04' -> date; None jeśli pusto lub nie da się sparsować"""
+    if isinstance(value, date):
+        return value
+    value = (value or "").strip()
+    for fmt in SHIP_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+def parse_time_slot(value) -> time | None:
+    """'17:00' -> time; None jeśli pusto lub nie da się sparsować"""
+    value = (value or "").strip()
+    for fmt in TIME_SLOT_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            pass
+    return None
+
+def operational_day(moment: datetime | None = None) -> date:
+    """Dzień operacyjny dla danej chwili (domyślnie teraz, czas lokalny serwera)"""
+    moment = moment or datetime.now()
+    return (moment - timedelta(hours=OP_DAY_START_HOUR)).date()
+
+def typed_values(values: dict) -> dict:
+    """Dla UPDATE-ów zbiorczych: dopisuje ship_day/slot_time, jeśli zmieniają się ich źródła"""
+    out = dict(values)
+    if values.get("ship_date"):
+        day = parse_ship_date(values["ship_date"])
+        if day:
+            out["ship_day"] = day
+    if "time_slot" in values:
+        out["slot_time"] = parse_time_slot(values["time_slot"])
+    return out
+
+@event.listens_for(Load, "before_insert")
+@event.listens_for(Load, "before_update")
+def sync_typed_columns(mapper, connection, target):
+    """Utrzymuje ship_day/slot_time zgodne z tekstowymi ship_date/time_slot.
+
+    Rekord bez daty wysyłki trafia do bieżącego dnia operacyjnego, dzięki czemu
+    każdy wiersz ma ship_day i tablica może filtrować po indeksie.
+    """
+    target.ship_day = parse_ship_date(target.ship_date) or target.ship_day or operational_day()
+    target.slot_time = parse_time_slot(target.time_slot)
+    # rekord przeniesiony na inny dzień - rollup KPI musi przeliczyć też stary dzień
+    old_days = [d for d in inspect(target).attrs.ship_day.history.deleted if d is not None]
+    if old_days:
+        connection.execute(KpiDirtyDay.__table__.insert(), [{"ship_day": d} for d in old_days])
+
+
+class LoadTombstone(Base):
+    """Ślad po usuniętym rekordzie - klienci synchronizujący zmiany widzą też usunięcia"""
+    __tablename__ = "load_tombstones"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    load_id: Mapped[int] = mapped_column(Integer)
+    revision: Mapped[int] = mapped_column(Integer, index=True)
+    time_slot: Mapped[str | None] = mapped_column(String(5), nullable=True)
+    lane: Mapped[str | None] = mapped_column(String(10), nullable=True)
+    area: Mapped[str | None] = mapped_column(String(10), nullable=True)
+    ship_day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class LoadEvent(Base):
+    """Tabela powiadomień o zmianach - źródło zdarzeń SSE dla wszystkich workerów"""
+    __tablename__ = "load_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    revision: Mapped[int] = mapped_column(Integer)
+    op: Mapped[str] = mapped_column(String(10))                    # create/update/delete/lane/reset
+    load_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    time_slot: Mapped[str | None] = mapped_column(String(5), nullable=True)
+    lane: Mapped[str | None] = mapped_column(String(10), nullable=True)
+    ship_day: Mapped[date | None] = mapped_column(Date, nullable=True)
+    fields: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON ze zmienionymi polami
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class LoadCreateKey(Base):
+    """Klucz nadany przez przeglądarkę nowemu wierszowi (autosave) - ponowione
+    wysłanie tego samego patcha zwraca istniejący rekord zamiast tworzyć duplikat"""
+    __tablename__ = "load_create_keys"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    load_id: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class BoardState(Base):
+    """Jeden wiersz z monotonicznie rosnącą wersją tablicy (współdzielony przez wszystkie workery)"""
+    __tablename__ = "board_state"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # tombstone/zdarzenia do tej wersji zostały usunięte (retencja) - starszy kursor wymaga resetu
+    pruned_revision: Mapped[int | None] = mapped_column(Integer, default=0, nullable=True)
+    # wersja tablicy, do której przeliczono kpi_rollup
+    kpi_revision: Mapped[int | None] = mapped_column(Integer, default=0, nullable=True)
+    # wersja danych użytkowników (user_cache) - podbijana przy każdej zmianie/usunięciu konta
+    users_version: Mapped[int | None] = mapped_column(Integer, default=0, nullable=True)
+
+
+class KpiRollup(Base):
+    """Zagregowane KPI z `loads` + `loads_archive`: dzień x zmiana x kompletujący x pas x godzina.
 
+    Przeliczane całymi dniami przez kpi_rollup.refresh(); brak wartości
+    zapisujemy jako "" / -1, żeby unikalny klucz działał także dla NULL.
+    """
+    __tablename__ = "kpi_rollup"
+    __table_args__ = (
+        UniqueConstraint("ship_day", "shift", "picker", "lane", "hour", name="uq_kpi_rollup_key"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ship_day: Mapped[date] = mapped_column(Date, index=True)
+    shift: Mapped[str] = mapped_column(String(1), default="")
+    picker: Mapped[str] = mapped_column(String(50), default="")
+    lane: Mapped[str] = mapped_column(String(10), default="")
+    hour: Mapped[int] = mapped_column(Integer, default=-1)       # godzina slotu (time_slot)
+    loads: Mapped[int] = mapped_column(Integer, default=0)
+    planned: Mapped[int] = mapped_column(Integer, default=0)
+    done: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class KpiDirtyDay(Base):
+    """Dni do przeliczenia w kpi_rollup, których nie widać po rewizji (rekord zmienił dzień)"""
+    __tablename__ = "kpi_dirty_days"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ship_day: Mapped[date] = mapped_column(Date)
+
+
+class Job(Base):
+    """Zadanie w tle (import, KPI, dane testowe...) - kolejka w bazie, wykonywane przez jobs.py worker"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # worker wybiera najstarsze gotowe do uruchomienia: status + run_after
+        Index("ix_jobs_queue", "status", "run_after"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    status: Mapped[str] = mapped_column(String(10), default="queued")   # queued/running/done/failed
+    payload: Mapped[str | None] = mapped_column(Text, nullable=True)    # JSON z parametrami
+    result: Mapped[str | None] = mapped_column(Text, nullable=True)     # JSON z wynikiem
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    progress: Mapped[int] = mapped_column(Integer, default=0)           # 0-100
+    message: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=3)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    locked_by: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_by_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,95 @@
+# passwords.py
+"""
+Hasła użytkowników: polityka hashowania i ograniczona pula weryfikacji.
+
+Weryfikacja pbkdf2 to kilkadziesiąt milisekund CPU. Przy zmianie zmiany
+(kilkadziesiąt logowań w ciągu minuty) wykonujemy ją w puli o stałym
+rozmiarze z krótką kolejką - gdy pula jest pełna, logowanie od razu dostaje
+429 z Retry-After zamiast blokować wątki obsługujące tablicę.
+
+Zmienne środowiskowe:
+    PASSWORD_ROUNDS        liczba rund pbkdf2_sha256 (domyślnie 29000, jak w passlib)
+    LOGIN_VERIFY_WORKERS   równoległe weryfikacje na proces (domyślnie liczba CPU)
+    LOGIN_VERIFY_QUEUE     ile logowań może czekać w kolejce (domyślnie max(16, 4 x workers))
+    LOGIN_VERIFY_TIMEOUT   maksymalny czas oczekiwania na wynik w sekundach (domyślnie 10)
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from passlib.context import CryptContext
+
+PASSWORD_ROUNDS = int(os.getenv("PASSWORD_ROUNDS", "29000"))
+LOGIN_VERIFY_WORKERS = int(os.getenv("LOGIN_VERIFY_WORKERS", str(os.cpu_count() or 2)))
+LOGIN_VERIFY_QUEUE = int(os.getenv("LOGIN_VERIFY_QUEUE", str(max(16, 4 * LOGIN_VERIFY_WORKERS))))
+LOGIN_VERIFY_TIMEOUT = float(os.getenv("LOGIN_VERIFY_TIMEOUT", "10"))
+RETRY_AFTER = 2   # sekundy, podpowiedź dla klienta przy 429
+
+# Zmiana PASSWORD_ROUNDS oznacza stare hashe jako "do odświeżenia" - przy
+# następnym udanym logowaniu hash jest przeliczany według nowej polityki.
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    pbkdf2_sha256__rounds=PASSWORD_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_ROUNDS,
+    pbkdf2_sha256__max_rounds=PASSWORD_ROUNDS,
+)
+
+
+class VerifierBusy(Exception):
+    """Pula weryfikacji jest pełna - klient powinien spróbować ponownie"""
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update(password: str, password_hash: str):
+    """(czy_poprawne, nowy_hash albo None) - synchronicznie, w bieżącym wątku"""
+    try:
+        return pwd_context.verify_and_update(password, password_hash)
+    except ValueError:
+        # uszkodzony lub nieznany format hasha
+        return False, None
+
+
+class Verifier:
+    """Pula wątków z ograniczoną liczbą zadań (wykonywane + czekające).
+
+    hashlib.pbkdf2_hmac zwalnia GIL, więc weryfikacje w puli działają
+    równolegle, a ich liczba nigdy nie przekracza `workers`.
+    """
+
+    def __init__(self, workers=LOGIN_VERIFY_WORKERS, queue=LOGIN_VERIFY_QUEUE, timeout=LOGIN_VERIFY_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # pula wątków nie przeżywa fork() - tworzymy ją w procesie workera
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwd-verify")
+                self._pid = os.getpid()
+            return self._pool
+
+    def verify(self, password: str, password_hash: str):
+        """Jak verify_and_update, ale w puli; VerifierBusy gdy brak miejsca"""
+        if not self._slots.acquire(blocking=False):
+            raise VerifierBusy()
+        try:
+            future = self._executor().submit(verify_and_update, password, password_hash)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # jeszcze nie rozpoczęte - nie liczymy na darmo; callback zwalnia miejsce
+            future.cancel()
+            raise VerifierBusy()
+
+
+verifier = Verifier()
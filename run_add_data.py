@@ -1,18 +1,47 @@
 #!/usr/bin/env python3
 """
-Uruchom skrypt dodawania danych testowych
+Zleca dodanie danych testowych jako zadanie w tle (kolejka w bazie, jobs.py).
+
+    python run_add_data.py          # dodaj do kolejki
+    python run_add_data.py --wait   # dodaj i czekaj na wynik
+
+Zadanie wykonuje `python jobs.py worker` (przy JOBS_INLINE=1 - od razu).
 """
-import subprocess
-import sys
+import argparse
+import json
 import os
+import sys
+import time
+
+# Dodaj ścieżkę do modułów aplikacji
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db import SessionLocal, engine
+from models import Job
+from migrations import run_migrations
+import jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dane testowe jako zadanie w tle")
+    parser.add_argument("--wait", action="store_true", help="czekaj na zakończenie zadania")
+    args = parser.parse_args(argv)
+
+    run_migrations(engine)
+    job_id = jobs.submit("seed_test_data")
+    print(f"Zadanie #{job_id} w kolejce (wykona je `python jobs.py worker`)")
+    while args.wait:
+        with SessionLocal() as db:
+            job = db.get(Job, job_id)
+            status, error = job.status, job.error
+            result = json.loads(job.result) if job.result else {}
+        if status in ("done", "failed"):
+            note = error or result.get("skipped") or result.get("message")
+            print(f"Zadanie #{job_id}: {status}" + (f" – {note}" if note else ""))
+            return 0 if status == "done" else 1
+        time.sleep(1)
+    return 0
+
 
-# Uruchom skrypt dodawania danych
-try:
-    result = subprocess.run([sys.executable, "add_test_data.py"], 
-                          capture_output=True, text=True, cwd=os.getcwd())
-    print("STDOUT:", result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
-    print("Return code:", result.returncode)
-except Exception as e:
-    print(f"Błąd: {e}")
+if __name__ == "__main__":
+    sys.exit(main())
@@ -143,98 +143,476 @@
 //
 // – działa dla inputów: planned, done, lo_code, picker
 // – odnajduje formularz przez `HTMLInputElement.form` (czyli zadziała dla row-… i create-…)
-// – debouncing 500 ms per–formularz
+// – zmiany ze WSZYSTKICH wierszy zbieramy i wysyłamy jednym POST /loads/batch
+//   na okno debounce (SAVE_DELAY_MS, ale nie rzadziej niż co SAVE_MAX_WAIT_MS)
+// – nowy wiersz po zapisie dostaje id, a jego formularz staje się formularzem edycji
+// – nowy wiersz ma losowy client_key, więc ponowienie po zgubionej odpowiedzi nie tworzy duplikatu
+// – ponawiamy tylko błędy sieci i 5xx; 4xx/przekierowanie (np. wygasła sesja) kończy próby
 
 document.addEventListener('DOMContentLoaded', () => {
-  const NAME_SELECTOR = 'input[name="planned"], input[name="done"], input[name="lo_code"], input[name="picker"]';
-  const inputs = document.querySelectorAll('.lt-table tbody ' + NAME_SELECTOR);
-
-  // osobny timer dla każdego formularza
-  const timers = new WeakMap();
-
-  function submitDebounced(form) {
-    if (!form) return;
-    const prev = timers.get(form);
-    if (prev) clearTimeout(prev);
-    const t = setTimeout(() => {
-      try {
-        // dodaj delikatny stan „zapisywanie"
-        form.classList.add('is-saving');
-        
-        // AJAX POST zamiast form.requestSubmit() - bez przeładowania strony
-        const formData = new FormData(form);
-        const loadId = form.action.split('/').pop();
-        
-        fetch(form.action, {
-          method: 'POST',
-          body: formData,
-          headers: {
-            'X-Requested-With': 'XMLHttpRequest'
-          }
-        })
-        .then(response => {
-          if (response.ok) {
-            // Pokaż wizualną informację o zapisaniu
-            const input = form.querySelector('input:focus');
-            if (input) {
-              input.style.backgroundColor = '#d4edda';
-              setTimeout(() => {
-                input.style.backgroundColor = '';
-              }, 1000);
-            }
-          } else {
-            console.error('Błąd zapisu:', response.statusText);
-          }
-        })
-        .catch(error => {
-          console.error('Błąd sieci:', error);
-        })
-        .finally(() => {
-          setTimeout(() => form.classList.remove('is-saving'), 1000);
+  if (window.LT_autosave) return; // skrypt już zainicjalizowany (ponowne dołączenie)
+
+  const CELL_NAMES = ['planned', 'done', 'lo_code', 'picker'];
+  const NAME_SELECTOR = CELL_NAMES.map(n => `.lt-table tbody input[name="${n}"]`).join(', ');
+  const SAVE_DELAY_MS = 1000;
+  const SAVE_MAX_WAIT_MS = 3000;
+  const RETRY_MAX_MS = 30000;
+
+  const batchUrl = document.querySelector('.lt-board-scroll')?.dataset.batchUrl || '/loads/batch';
+  const pending = new Map();   // form -> Set(nazw zmienionych pól)
+  let timer = null;
+  let firstPendingAt = 0;
+  let inFlight = false;
+  let failures = 0;          // kolejne nieudane próby (odstęp ponowienia rośnie)
+  let halted = false;        // sesja wygasła - nie wysyłamy, dopóki strona nie zostanie przeładowana
+
+  const formInputs = (form) => document.querySelectorAll(`input[form="${form.id}"]`);
+  const isCreateForm = (form) => form.id.startsWith('create-');
+  const newClientKey = () => window.crypto?.randomUUID?.()
+    || `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+
+  function flash(form, names, ok) {
+    formInputs(form).forEach(el => {
+      if (!names.has(el.name)) return;
+      el.style.backgroundColor = ok ? '#d4edda' : '#f8d7da';
+      setTimeout(() => { el.style.backgroundColor = ''; }, ok ? 1000 : 3000);
+    });
+  }
+
+  function buildPatch(form, names) {
+    const fields = {};
+    formInputs(form).forEach(el => { if (names.has(el.name)) fields[el.name] = el.value; });
+    if (isCreateForm(form)) {
+      // nowy wiersz: dołącz ukryte pola formularza (time_slot, lane, area, …)
+      form.querySelectorAll('input[type="hidden"]').forEach(el => {
+        if (el.value !== '') fields[el.name] = el.value;
+      });
+      // ten sam klucz przy każdym ponowieniu - do czasu, aż serwer zwróci id
+      if (!form.dataset.clientKey) form.dataset.clientKey = newClientKey();
+      return { key: form.id, client_key: form.dataset.clientKey, fields };
+    }
+    return { key: form.id, id: parseInt(form.action.split('/').slice(-2)[0], 10), fields };
+  }
+
+  // po utworzeniu rekordu przepinamy formularz create-… na row-<id> (kolejne zmiany to edycja)
+  function promoteCreateForm(form, id) {
+    const newId = `row-${id}`;
+    formInputs(form).forEach(el => el.setAttribute('form', newId));
+    form.id = newId;
+    form.action = `/loads/${id}/edit`;
+    delete form.dataset.clientKey;
+  }
+
+  function requeue(entries) {
+    entries.forEach(([form, names]) => {
+      const cur = pending.get(form) || new Set();
+      names.forEach(n => cur.add(n));
+      pending.set(form, cur);
+    });
+  }
+
+  function flush() {
+    timer = null;
+    if (halted) return;
+    if (inFlight) { schedule(); return; }
+    if (!pending.size) return;
+
+    const entries = [...pending.entries()];
+    pending.clear();
+    firstPendingAt = 0;
+
+    const byKey = new Map(entries.map(([form, names]) => [form.id, { form, names }]));
+    const patches = entries.map(([form, names]) => buildPatch(form, names));
+    entries.forEach(([form]) => form.classList.add('is-saving'));
+
+    inFlight = true;
+    fetch(batchUrl, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest' },
+      credentials: 'same-origin',
+      body: JSON.stringify({ patches })
+    })
+      .then(r => {
+        const isJson = (r.headers.get('Content-Type') || '').includes('application/json');
+        if (r.ok && isJson && !r.redirected) return r.json();
+        // strona logowania (przekierowanie), strona błędu itp. zamiast wyniku
+        const err = new Error(`HTTP ${r.status}`);
+        err.sessionLost = r.redirected || r.status === 401;
+        err.retry = !err.sessionLost && r.status >= 500;
+        throw err;
+      })
+      .then(data => {
+        failures = 0;
+        (data.results || []).forEach(res => {
+          const entry = byKey.get(res.key);
+          if (!entry) return;
+          if (res.success && isCreateForm(entry.form) && res.id) promoteCreateForm(entry.form, res.id);
+          if (!res.success) console.error('Błąd zapisu wiersza:', res.key, res.error);
+          flash(entry.form, entry.names, res.success);
         });
-        
-      } catch (error) {
-        console.error('Błąd:', error);
-        form.classList.remove('is-saving');
-      }
-    }, 1000); // Zwiększony timeout na 1 sekundę
-    timers.set(form, t);
+      })
+      .catch(error => {
+        if (error.sessionLost) {
+          // zmiany zostają w kolejce, ale bez ponowień - i tak trafiłyby na stronę logowania
+          console.error('Sesja wygasła - autosave wstrzymany');
+          halted = true;
+          requeue(entries);
+          if (confirm('Sesja wygasła - ostatnie zmiany nie zostały zapisane. Przejść do logowania?')) {
+            location.reload();
+          }
+          return;
+        }
+        if (error.retry === false) {
+          // serwer odrzucił żądanie (4xx) - ponowienie nic nie zmieni
+          console.error('Zapis odrzucony:', error);
+          entries.forEach(([form, names]) => flash(form, names, false));
+          return;
+        }
+        console.error('Błąd sieci:', error);
+        // nic nie ginie: niezapisane zmiany wracają do kolejki (nowe wiersze z tym samym client_key)
+        requeue(entries);
+        failures += 1;
+        schedule();
+      })
+      .finally(() => {
+        inFlight = false;
+        entries.forEach(([form]) => setTimeout(() => form.classList.remove('is-saving'), 1000));
+      });
+  }
+
+  function schedule() {
+    if (halted) return;
+    if (timer) clearTimeout(timer);
+    if (!firstPendingAt) firstPendingAt = Date.now();
+    let wait = Math.min(SAVE_DELAY_MS, Math.max(0, firstPendingAt + SAVE_MAX_WAIT_MS - Date.now()));
+    if (failures) wait = Math.min(RETRY_MAX_MS, SAVE_DELAY_MS * 2 ** failures);
+    timer = setTimeout(flush, wait);
   }
 
-  inputs.forEach(inp => {
+  function queueChange(form, name) {
+    if (!form || !form.id) return;
+    const names = pending.get(form) || new Set();
+    names.add(name);
+    pending.set(form, names);
+    schedule();
+  }
+
+  // nasłuch na dokumencie - działa też dla kart podmienionych przez LT_sync
+  const handler = (e) => {
+    const inp = e.target;
+    if (!inp.matches?.(NAME_SELECTOR)) return;
     // Najpewniej: input.form zwraca powiązany <form> (także gdy form jest poza wierszem)
-    const getForm = () => inp.form
+    const form = inp.form
       || inp.closest('tr')?.querySelector('form')      // awaryjnie
       || inp.closest('form');                           // ostatnia deska
+    queueChange(form, inp.name);
+  };
+  document.addEventListener('input', handler);
+  document.addEventListener('change', handler);
 
-    const handler = () => submitDebounced(getForm());
-    inp.addEventListener('input', handler);
-    inp.addEventListener('change', handler);
+  // zapisz zaległe zmiany przy opuszczaniu strony
+  window.addEventListener('pagehide', () => {
+    if (!pending.size) return;
+    const patches = [...pending.entries()].map(([form, names]) => buildPatch(form, names));
+    navigator.sendBeacon?.(batchUrl, new Blob([JSON.stringify({ patches })], { type: 'application/json' }));
   });
 
+  window.LT_autosave = { flush, pendingCount: () => pending.size, busy: () => pending.size > 0 || inFlight };
+
   // ====== Obsługa zmiany statusu - pokaż/ukryj przycisk WYCZYŚĆ ======
-  const statusSelects = document.querySelectorAll('select[name="status"]:not([disabled])');
-  statusSelects.forEach(select => {
-    select.addEventListener('change', function() {
-      const laneCard = this.closest('.lt-lane');
-      const timeSlot = laneCard.dataset.time;
-      const lane = laneCard.dataset.lane;
-      const clearButtonField = document.getElementById(`clear-btn-${timeSlot}-${lane}`);
-      
-      if (this.value === 'LO') {
-        // Pokaż przycisk WYCZYŚĆ natychmiastowo
-        if (clearButtonField) {
-          clearButtonField.style.display = 'block';
-        }
-      } else {
-        // Ukryj przycisk WYCZYŚĆ natychmiastowo
-        if (clearButtonField) {
-          clearButtonField.style.display = 'none';
+  document.addEventListener('change', (e) => {
+    const select = e.target;
+    if (!select.matches?.('select[name="status"]:not([disabled])')) return;
+    const laneCard = select.closest('.lt-lane');
+    if (!laneCard) return;
+    const timeSlot = laneCard.dataset.time;
+    const lane = laneCard.dataset.lane;
+    const clearButtonField = document.getElementById(`clear-btn-${timeSlot}-${lane}`);
+
+    if (clearButtonField) {
+      // Pokaż/ukryj przycisk WYCZYŚĆ natychmiastowo
+      clearButtonField.style.display = select.value === 'LO' ? 'block' : 'none';
+    }
+  });
+});
+
+// ====== Synchronizacja zmian (SSE + delta-sync) zamiast przeładowania strony ======
+//
+// – zdarzenia zmian przychodzą strumieniem /loads/stream (EventSource)
+// – gdy strumień nie działa, co POLL_MS pyta /loads/changes?since=<kursor>
+// – zmienione wartości wpisuje bezpośrednio w komórki odpowiedniej karty (time_slot + lane)
+// – pól, w których użytkownik właśnie pisze (fokus), nie nadpisujemy
+// – zmiany "strukturalne" (nowy wiersz, przeniesienie, usunięcie, zmiana nagłówka) → podmiana
+//   tylko dotkniętych kart HTML-em z /loads/lane (karta z fokusem albo przy trwającym
+//   autosave czeka, aż użytkownik skończy)
+// – przeładowanie całej strony tylko przy resecie albo gdy karty/slotu nie ma na stronie
+(function () {
+  if (window.LT_sync) return; // skrypt już zainicjalizowany (ponowne dołączenie)
+
+  const POLL_MS = 5000;
+  const STREAM_POLL_MS = 60000;   // przy działającym SSE tylko rzadka kontrola
+  const CARD_RETRY_MS = 1000;     // ponowna próba podmiany odłożonej karty
+  const CARD_MAX_TRIES = 3;       // replika wciąż za starą wersją → przeładowanie strony
+  const CELL_FIELDS = ['planned', 'done', 'lo_code', 'picker'];
+
+  let root = null;
+  let cursor = null;
+  let inFlight = false;
+  let needsReload = false;
+  let streamOpen = false;
+  let lastPoll = 0;
+  const dirty = new Map();        // "slot|pas" -> liczba prób podmiany
+  let refreshTimer = null;
+
+  const esc = (v) => (window.CSS && CSS.escape) ? CSS.escape(String(v)) : String(v);
+
+  function findCard(timeSlot, lane) {
+    return document.querySelector(`.lt-lane[data-time="${esc(timeSlot)}"][data-lane="${esc(lane)}"]`);
+  }
+
+  function rowInputs(loadId) {
+    return document.querySelectorAll(`input[form="row-${loadId}"]`);
+  }
+
+  function isFocusedInTable() {
+    const el = document.activeElement;
+    return !!(el && el.closest && el.closest('.lt-lane'));
+  }
+
+  function markDirty(card) {
+    if (card) dirty.set(`${card.dataset.time}|${card.dataset.lane}`, 0);
+    return true;
+  }
+
+  function headerMatches(card, row) {
+    const trailer = card.querySelector('.lt-card-header input[name="trailer_no"]');
+    const status = card.querySelector('.lt-card-header select[name="status"]');
+    if (trailer && row.trailer_no && trailer.value !== row.trailer_no) return false;
+    if (status && row.status && status.value !== row.status) return false;
+    return true;
+  }
+
+  // true = zastosowano w miejscu (albo zmiana nas nie dotyczy), false = potrzebne przeładowanie
+  function applyChanged(row) {
+    const lane = (row.lane || 'L01').toUpperCase();
+    const card = findCard(row.time_slot, lane);
+    const inputs = rowInputs(row.id);
+
+    if (inputs.length === 0 && isOtherDay(row)) return true;   // inny dzień niż na tablicy
+    if (!card) {
+      // rekord spoza widocznego filtra i nieobecny na stronie – ignorujemy
+      const filter = root.dataset.filterTime;
+      return !!filter && row.time_slot !== filter && inputs.length === 0;
+    }
+    if (inputs.length === 0) return markDirty(card);       // nowy wiersz
+    if (!card.contains(inputs[0])) {                       // rekord przeniesiony do innej karty
+      markDirty(inputs[0].closest('.lt-lane'));
+      return markDirty(card);
+    }
+    if (!headerMatches(card, row)) return markDirty(card);
+
+    inputs.forEach(el => {
+      if (!CELL_FIELDS.includes(el.name) || el === document.activeElement) return;
+      const v = row[el.name] == null ? '' : String(row[el.name]);
+      if (el.value !== v) el.value = v;
+    });
+    return true;
+  }
+
+  function isOtherDay(row) {
+    const day = root.dataset.boardDay;
+    return !!day && !!row.ship_day && row.ship_day !== day;
+  }
+
+  function applyDeleted(row) {
+    const inputs = rowInputs(row.id);
+    return inputs.length === 0 || markDirty(inputs[0].closest('.lt-lane'));
+  }
+
+  function applyLane(ev) {
+    if (isOtherDay(ev)) return true;
+    const card = findCard(ev.time_slot, (ev.lane || 'L01').toUpperCase());
+    if (!card) return !!root.dataset.filterTime && ev.time_slot !== root.dataset.filterTime;
+    const keys = Object.keys(ev.fields || {});
+    if (keys.some(k => !CELL_FIELDS.includes(k))) {               // zmiana nagłówka karty
+      const fields = ev.fields;
+      if (fields.time_slot || fields.lane) {
+        // karta przeniesiona: jeśli docelowej nie ma na stronie - przeładowanie
+        const target = findCard(fields.time_slot || ev.time_slot, (fields.lane || ev.lane || 'L01').toUpperCase());
+        if (!target) return false;
+        markDirty(target);
+      }
+      return markDirty(card);
+    }
+    card.querySelectorAll('tbody input').forEach(el => {
+      if (!keys.includes(el.name) || el === document.activeElement) return;
+      const v = ev.fields[el.name] == null ? '' : String(ev.fields[el.name]);
+      if (el.value !== v) el.value = v;
+    });
+    return true;
+  }
+
+  // zdarzenie SSE → ta sama logika co dla wiersza z /loads/changes
+  function applyEvent(ev) {
+    const row = Object.assign({ id: ev.id, time_slot: ev.time_slot, lane: ev.lane, ship_day: ev.ship_day }, ev.fields);
+    switch (ev.op) {
+      case 'update':
+      case 'create': return applyChanged(row);
+      case 'delete': return applyDeleted(row);
+      case 'lane':   return applyLane(ev);
+      default:       return false;   // reset i nieznane operacje
+    }
+  }
+
+  function finish(ok, touched) {
+    if (!ok) {
+      needsReload = true;
+      if (!isFocusedInTable()) location.reload();
+      return;
+    }
+    if (touched && typeof updateRowColors === 'function') updateRowColors();
+    refreshCards();
+  }
+
+  function scheduleRefresh() {
+    if (!refreshTimer) refreshTimer = setTimeout(() => { refreshTimer = null; refreshCards(); }, CARD_RETRY_MS);
+  }
+
+  // podmienia karty z `dirty` na świeży HTML z /loads/lane
+  function refreshCards() {
+    if (!dirty.size || needsReload) return;
+    if (window.LT_autosave?.busy()) { scheduleRefresh(); return; }   // najpierw zapis, potem podmiana
+
+    const need = cursor;
+    const jobs = [...dirty.entries()].map(([key, tries]) => {
+      const [ts, lane] = key.split('|');
+      const card = findCard(ts, lane);
+      if (card && card.contains(document.activeElement)) return null;   // użytkownik pisze w tej karcie
+      dirty.delete(key);
+      return fetchCard(ts, lane).then(res => {
+        if (!res) { needsReload = true; return; }                       // slotu już nie ma
+        if (res.version < need) {                                       // odczyt z opóźnionej repliki
+          if (tries + 1 >= CARD_MAX_TRIES) needsReload = true;
+          else if (!dirty.has(key)) dirty.set(key, tries + 1);
+          return;
         }
+        swapCard(ts, lane, res.html, key);
+      }).catch(err => {
+        console.error('Błąd odświeżania karty:', err);
+        if (!dirty.has(key)) dirty.set(key, tries + 1);
+      });
+    }).filter(Boolean);
+
+    Promise.all(jobs).then(() => {
+      if (needsReload) {
+        if (!isFocusedInTable()) location.reload();
+        return;
       }
+      if (jobs.length && typeof updateRowColors === 'function') updateRowColors();
+      if (dirty.size) scheduleRefresh();
     });
-  });
-});
+  }
+
+  function fetchCard(ts, lane) {
+    const params = new URLSearchParams({ time_slot: ts, lane, ship_date: root.dataset.boardDay || 'all' });
+    if (root.dataset.filterShift) params.set('shift', root.dataset.filterShift);
+    return fetch(`${root.dataset.laneUrl}?${params}`, {
+      headers: { 'X-Requested-With': 'XMLHttpRequest' },
+      credentials: 'same-origin'
+    }).then(r => {
+      if (r.status === 404) return null;
+      if (!r.ok) return Promise.reject(r.statusText);
+      const version = parseInt(r.headers.get('X-Board-Version'), 10) || 0;
+      return r.text().then(html => ({ html, version }));
+    });
+  }
+
+  function swapCard(ts, lane, html, key) {
+    const card = findCard(ts, lane);
+    if (!card) return;
+    // w czasie pobierania użytkownik wszedł do karty albo zaczął coś zapisywać - spróbuj później
+    if (card.contains(document.activeElement) || window.LT_autosave?.busy()) {
+      if (!dirty.has(key)) dirty.set(key, 0);
+      return;
+    }
+    const tpl = document.createElement('template');
+    tpl.innerHTML = html.trim();
+    card.replaceWith(tpl.content);
+  }
+
+  function onStreamChanges(msg) {
+    let list;
+    try { list = JSON.parse(msg.data); } catch { return; }
+    const fresh = list.filter(ev => ev.revision > cursor);
+    if (!fresh.length) return;
+    let ok = true;
+    fresh.forEach(ev => { ok = applyEvent(ev) && ok; });
+    cursor = Math.max(cursor, ...fresh.map(ev => ev.revision));
+    finish(ok, true);
+  }
+
+  function openStream() {
+    const url = root.dataset.streamUrl;
+    if (!url || !window.EventSource) return;
+    const es = new EventSource(url, { withCredentials: true });
+    es.addEventListener('hello', () => { streamOpen = true; poll(); }); // dociągnij lukę od renderu strony
+    es.addEventListener('changes', onStreamChanges);
+    es.addEventListener('resync', () => poll());
+    es.onerror = () => { streamOpen = false; };   // EventSource sam się połączy ponownie
+  }
+
+  function poll() {
+    if (!root || inFlight || document.visibilityState !== 'visible') return;
+
+    if (needsReload) {
+      if (!isFocusedInTable()) location.reload();
+      return;
+    }
+
+    inFlight = true;
+    lastPoll = Date.now();
+    fetch(`${root.dataset.changesUrl}?since=${encodeURIComponent(cursor)}`, {
+      headers: { 'Accept': 'application/json', 'X-Requested-With': 'XMLHttpRequest' },
+      credentials: 'same-origin'
+    })
+      .then(r => r.ok ? r.json() : Promise.reject(r.statusText))
+      .then(data => {
+        let ok = !data.reset;
+        if (ok) {
+          data.changed.forEach(row => { ok = applyChanged(row) && ok; });
+          data.deleted.forEach(row => { ok = applyDeleted(row) && ok; });
+        }
+        cursor = Math.max(cursor, data.cursor);
+        finish(ok, data.changed.length > 0);
+      })
+      .catch(err => console.error('Błąd synchronizacji:', err))
+      .finally(() => { inFlight = false; });
+  }
+
+  function start() {
+    root = document.querySelector('.lt-board-scroll[data-version]');
+    if (!root) return;
+    cursor = parseInt(root.dataset.version, 10) || 0;
+    openStream();
+    setInterval(() => {
+      if (needsReload || Date.now() - lastPoll >= (streamOpen ? STREAM_POLL_MS : POLL_MS)) poll();
+    }, POLL_MS);
+    document.addEventListener('visibilitychange', poll, { passive: true });
+    // odłożone karty podmieniamy, gdy użytkownik wyjdzie z pola
+    document.addEventListener('focusout', () => { if (dirty.size) scheduleRefresh(); });
+  }
+
+  window.LT_sync = {
+    state: () => ({ cursor, inFlight, needsReload, streamOpen, dirtyCards: [...dirty.keys()] }),
+    pollNow: poll
+  };
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', start, { once: true });
+  } else {
+    start();
+  }
+})();
 
 // ====== Funkcja czyszczenia danych w kolumnie ======
 function clearLaneData(timeSlot, lane) {
@@ -259,6 +637,13 @@ function clearLaneData(timeSlot, lane) {
   laneInput.name = 'lane';
   laneInput.value = lane;
   form.appendChild(laneInput);
+
+  // dzień tablicy – czyścimy tylko kartę z widocznego dnia
+  const dayInput = document.createElement('input');
+  dayInput.type = 'hidden';
+  dayInput.name = 'ship_day';
+  dayInput.value = document.querySelector('.lt-board-scroll')?.dataset.boardDay || '';
+  form.appendChild(dayInput);
   
   // Dodaj formularz do body i wyślij
   document.body.appendChild(form);
@@ -0,0 +1,103 @@
+# user_cache.py
+"""
+Cache zalogowanych użytkowników dla Flask-Login (per proces).
+
+Zamiast `db.get(User, ...)` przy każdym żądaniu trzymamy niezmienną migawkę
+użytkownika (UserSnapshot) z limitem rozmiaru (LRU) i czasu życia (TTL).
+
+Unieważnianie:
+- lokalnie: `invalidate(user_id)` po zmianie w panelu użytkowników,
+- między workerami: każda zmiana lub usunięcie konta podbija
+  `board_state.users_version` w tej samej transakcji (zdarzenie ORM w
+  models.py). Proces sprawdza tę wersję najwyżej raz na
+  USER_CACHE_VERSION_CHECK sekund (nie przy każdym żądaniu) i po zmianie
+  czyści cały swój cache - usunięcie, dezaktywacja, zmiana roli albo hasła
+  w innym workerze działają tu najpóźniej po tym czasie.
+  TTL ogranicza czas życia pojedynczego wpisu.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import select
+from models import User, BoardState
+from board_cache import BOARD_STATE_ID
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))        # sekundy
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+# co ile sekund proces sprawdza board_state.users_version (zmiany w innych workerach)
+USER_CACHE_VERSION_CHECK = float(os.getenv("USER_CACHE_VERSION_CHECK", "5"))
+
+UserSnapshot = namedtuple("UserSnapshot", "id email full_name role is_active security_stamp")
+
+_lock = threading.Lock()
+_cache = OrderedDict()    # id -> (wygasa_o, UserSnapshot)
+_version = None           # ostatnio widziana board_state.users_version
+_version_checked = float("-inf")
+
+
+def snapshot(u: User) -> UserSnapshot:
+    return UserSnapshot(u.id, u.email, u.full_name, u.role, bool(u.is_active), u.security_stamp or "")
+
+
+def _cached(user_id, now):
+    with _lock:
+        hit = _cache.get(user_id)
+        if hit is not None and hit[0] > now:
+            _cache.move_to_end(user_id)
+            return hit[1]
+    return None
+
+
+def _check_version(db, now):
+    """Wersja użytkowników z bazy; inna niż ostatnio = ktoś zmienił konto - czyścimy cache"""
+    global _version, _version_checked
+    version = db.scalar(select(BoardState.users_version).where(BoardState.id == BOARD_STATE_ID)) or 0
+    with _lock:
+        if version != _version:
+            _cache.clear()
+            _version = version
+        _version_checked = now
+
+
+def get(db_factory, user_id: int, fresh=False):
+    """Migawka użytkownika z cache albo z bazy (None jeśli nie istnieje).
+
+    `fresh=True` pomija cache - np. gdy znacznik w sesji nie zgadza się
+    z zapamiętanym, bo zmiana mogła nastąpić w innym workerze.
+    """
+    now = time.monotonic()
+    check_due = now - _version_checked >= USER_CACHE_VERSION_CHECK
+    if not fresh and not check_due:
+        snap = _cached(user_id, now)
+        if snap is not None:
+            return snap
+
+    with db_factory() as db:
+        if check_due:
+            _check_version(db, now)
+            if not fresh:
+                snap = _cached(user_id, now)
+                if snap is not None:
+                    return snap
+        u = db.get(User, user_id)
+        snap = snapshot(u) if u else None
+
+    with _lock:
+        if snap is None:
+            _cache.pop(user_id, None)
+        else:
+            _cache[user_id] = (now + USER_CACHE_TTL, snap)
+            _cache.move_to_end(user_id)
+            while len(_cache) > USER_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return snap
+
+
+def invalidate(user_id=None):
+    """Usuwa użytkownika (albo wszystkich) z lokalnego cache"""
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(int(user_id), None)